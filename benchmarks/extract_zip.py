@@ -0,0 +1,75 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+
+from superelixier.file_handler import SEVENZIP
+from superelixier.file_handler.extractor import EXTRACT_THREADS, extract_zip
+
+
+def make_archive(path: str, members: int, size: int) -> None:
+    """
+    Many files in a few levels of directories, half compressible text and half random bytes, like a typical app.
+    """
+    rng = random.Random(0)
+    words = [bytes(rng.choices(b"abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 10))) for _ in range(2000)]
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for i in range(members):
+            length = rng.randint(size // 4, size * 2)
+            if i % 2:
+                data = rng.randbytes(length)
+            else:
+                data = b" ".join(rng.choices(words, k=length // 6))[:length]
+            archive.writestr(f"app/dir{i % 50}/sub{i % 7}/file{i}.dat", data)
+
+
+def run(label: str, function, destination: str) -> None:
+    shutil.rmtree(destination, ignore_errors=True)
+    os.makedirs(destination)
+    start = time.perf_counter()
+    function()
+    print(f"{label:<32} {time.perf_counter() - start:7.2f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare zip extraction paths on a synthetic archive")
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=64 * 1024, help="Average member size in bytes")
+    parser.add_argument("--threads", type=int, default=EXTRACT_THREADS)
+    args = parser.parse_args()
+    sevenzip = SEVENZIP if os.path.isfile(SEVENZIP) else shutil.which("7z")
+    with tempfile.TemporaryDirectory() as tmp:
+        archive, destination = os.path.join(tmp, "bench.zip"), os.path.join(tmp, "out")
+        make_archive(archive, args.members, args.size)
+        print(f"{args.members} members, {os.path.getsize(archive) / 1024**2:.0f} MiB compressed")
+        run("In-process, threads=1", lambda: extract_zip(archive, destination, threads=1), destination)
+        run(
+            f"In-process, threads={args.threads}",
+            lambda: extract_zip(archive, destination, threads=args.threads),
+            destination,
+        )
+        if sevenzip:
+            for flags in ([], ["-mmt=on"]):
+                command = [sevenzip, "x", "-aoa", *flags, archive]
+                run(
+                    " ".join(["7z x -aoa", *flags]),
+                    lambda: subprocess.run(command, cwd=destination, stdout=subprocess.DEVNULL),
+                    destination,
+                )
+        else:
+            print("7-Zip not found, skipping the subprocess path")
+
+
+if __name__ == "__main__":
+    main()
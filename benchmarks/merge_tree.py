@@ -0,0 +1,73 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from superelixier.file_handler import FileHandler
+from superelixier.generic.generic_app import UPDATER_JSON_SPEC
+
+
+def make_tree(root: str, files: int, offset: int = 0, changed: int = 0) -> None:
+    """
+    Small files in two levels of directories, 100 files per directory.
+
+    :param changed: Every nth file gets new content, 0 for none
+    """
+    for i in range(offset, offset + files):
+        directory = os.path.join(root, f"dir{i // 10000}", f"sub{i // 100 % 100}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{i}.dat"), "wb") as fd:
+            fd.write(b"new" if changed and i % changed == 0 else b"old")
+
+
+def merge(files: int, changed: int) -> None:
+    """
+    Update an app of the given size where half of the new files replace existing ones and one folder is appdata.
+    Of the replaced files, only every nth has new content, like in a nightly build. The first update walks the app
+    folder, the second one uses the manifest written by the first.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        app = SimpleNamespace(
+            name="Benchmark",
+            target_dir=tmp,
+            appdir=os.path.join(tmp, "Benchmark"),
+            random_id=0,
+            update_status="outdated",
+            version_installed=None,
+            version_latest=None,
+            definition=SimpleNamespace(local=SimpleNamespace(appdata=["dir0/sub0"])),
+        )
+        staging = os.path.join(tmp, ".superelixier-cache", "0")
+        make_tree(app.appdir, files // 2)
+        for label in ("walk", "manifest"):
+            handler = FileHandler(app)
+            make_tree(staging, files, offset=files // 4, changed=changed)
+            start = time.perf_counter()
+            handler.project_apply()
+            elapsed = time.perf_counter() - start
+            if os.path.isdir(os.path.join(tmp, ".superelixier-cache", ".deferred")):
+                raise RuntimeError("The app folder couldn't be locked, so the update was deferred instead of merged")
+            print(f"{files:>7} files, {label:<8} {elapsed:7.2f} s {elapsed / files * 1e6:7.1f} µs/file")
+            app.version_installed = SimpleNamespace(spec=UPDATER_JSON_SPEC)
+            changed += 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time merging a staged update into an installed app")
+    parser.add_argument("--files", type=int, nargs="+", default=[25000, 50000, 100000])
+    parser.add_argument("--changed", type=int, default=20, help="Every nth file has new content")
+    args = parser.parse_args()
+    for files in args.files:
+        merge(files, args.changed)
+
+
+if __name__ == "__main__":
+    main()
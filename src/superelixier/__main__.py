@@ -9,11 +9,12 @@ import sys
 import time
 import traceback
 
-from superelixier import runtime
+from superelixier import configuration, runtime
 from superelixier.application import DefaultCommand, cli
 from superelixier.eula import check_terms
 from superelixier.helper.lock_file import LockFile, LockFileException
 from superelixier.helper.terminal import Ansi, clear, confirm_exit_app, print_header
+from superelixier.network.session import http_session
 
 __all__ = []
 
@@ -33,6 +34,7 @@ def main():
         try:
             check_terms()
             lock = LockFile()  # noqa
+            http_session.configure(**configuration.network)
             if len(sys.argv) == 1:
                 ret_code = DefaultCommand().run(cli.create_io())
             else:
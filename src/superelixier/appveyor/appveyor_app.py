@@ -5,10 +5,12 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
+import contextvars
 import json
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
-import requests as rest
 from requests import RequestException
 from urllib3.exceptions import HTTPError
 
@@ -18,6 +20,11 @@ from superelixier.definition import Definition
 from superelixier.generic.generic_app import GenericApp, VersionInfo
 from superelixier.helper.terminal import DENT, Ansi
 from superelixier.helper.types import JsonResponse
+from superelixier.network.response_cache import CachedResponse, ResponseCache
+from superelixier.network.session import http_session
+
+BUILD_LOOKAHEAD: int = 4  #: Builds to look up in parallel
+RESPONSE_CACHE = ResponseCache("appveyor")
 
 
 class AppveyorApp(GenericApp):
@@ -37,7 +44,7 @@ class AppveyorApp(GenericApp):
 
     def __api_request(self) -> JsonResponse:
         try:
-            api_response = rest.get(
+            api_response = http_session.get(
                 f"{API_URL}/projects/{self.user}/{self.project}/history?recordsNumber=20",
                 headers=self.headers,
             )
@@ -50,35 +57,74 @@ class AppveyorApp(GenericApp):
                 print(msg)
                 return None
             history = json.loads(api_response.text)["builds"]
-            job_id = None
-            for build in history:
-                if job_id:
-                    break
-                if build["status"] == "success" and build["branch"] == self.branch:
-                    api_response = rest.get(f"{API_URL}/projects/{self.user}/{self.project}/builds/{build['buildId']}")
-                    if api_response.status_code == 200:
-                        jobs = json.loads(api_response.text)["build"]["jobs"]
-                        for job in jobs:
-                            if job["status"] == "success":
-                                job_id = job["jobId"]
-                                break
-            if job_id:
-                artifacts = rest.get(f"{API_URL}/buildjobs/{job_id}/artifacts")
-            else:
-                return None
-            api_response = json.loads(artifacts.text)
-            if artifacts.status_code != 200:
-                print(f"{Ansi.ERROR}{self.name}: HTTP Status {artifacts.status_code}: {api_response['message']}")
+            build_ids = [i["buildId"] for i in history if i["status"] == "success" and i["branch"] == self.branch]
+            job_id = self.__find_job(build_ids)
+            if job_id is None:
                 return None
+            api_response = self.__get_artifacts(job_id)
             # Handle hypothetical case where successful build has no artifacts. The JSON response would be []:
-            if len(api_response) == 0:
+            if not api_response:
                 return None
-            for file in api_response:
-                file["jobId"] = job_id
         except (RequestException, HTTPError):
             return None
         return api_response
 
+    def __find_job(self, build_ids: list[int]) -> str | None:
+        """
+        Find the first successful job of the newest build that has one. Builds that are already known are looked up
+        in the cache, the others are requested a few at a time in parallel.
+        """
+        index = 0
+        while index < len(build_ids):
+            cached = RESPONSE_CACHE.load(self.__build_url(build_ids[index]))
+            if cached is not None:
+                if cached.data:
+                    return cached.data
+                index += 1
+                continue
+            window = build_ids[index : index + BUILD_LOOKAHEAD]
+            with ThreadPoolExecutor(max_workers=len(window)) as executor:
+                # Each lookup runs in a copy of this context, so that the deadline and priority of the check apply
+                jobs = [executor.submit(contextvars.copy_context().run, self.__get_job_id, build) for build in window]
+                for job in jobs:
+                    if job_id := job.result():
+                        return job_id
+            index += len(window)
+        return None
+
+    def __get_job_id(self, build_id: int) -> str | None:
+        url = self.__build_url(build_id)
+        if (cached := RESPONSE_CACHE.load(url)) is not None:
+            return cached.data
+        api_response = http_session.get(url)
+        if api_response.status_code != 200:
+            return None
+        job_id = None
+        for job in json.loads(api_response.text)["build"]["jobs"]:
+            if job["status"] == "success":
+                job_id = job["jobId"]
+                break
+        # Finished builds don't change, so neither does the outcome
+        RESPONSE_CACHE.store(CachedResponse(url=url, etag=None, last_modified=None, data=job_id))
+        return job_id
+
+    def __get_artifacts(self, job_id: str) -> JsonResponse:
+        url = f"{API_URL}/buildjobs/{job_id}/artifacts"
+        if (cached := RESPONSE_CACHE.load(url)) is not None:
+            return cached.data
+        artifacts = http_session.get(url)
+        api_response = json.loads(artifacts.text)
+        if artifacts.status_code != 200:
+            print(f"{Ansi.ERROR}{self.name}: HTTP Status {artifacts.status_code}: {api_response['message']}")
+            return None
+        for file in api_response:
+            file["jobId"] = job_id
+        RESPONSE_CACHE.store(CachedResponse(url=url, etag=None, last_modified=None, data=api_response))
+        return api_response
+
+    def __build_url(self, build_id: int) -> str:
+        return f"{API_URL}/projects/{self.user}/{self.project}/builds/{build_id}"
+
     def __get_latest_version(self) -> VersionInfo:
         from superelixier.appveyor.appveyor_manager import AppveyorManager
 
@@ -109,6 +155,14 @@ class AppveyorApp(GenericApp):
     def versioning(self):
         return "appveyor"
 
+    @property
+    def host(self):
+        return urlparse(API_URL).netloc
+
     @property
     def headers(self):
-        return {"Authorization": configuration.auth, "Content-type": "application/json"}
+        headers = {"Content-type": "application/json"}
+        token = configuration.auth.get("appveyor_token")
+        if isinstance(token, str) and token.strip():
+            headers["Authorization"] = token.strip()
+        return headers
@@ -6,18 +6,16 @@ If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import os
-from concurrent.futures import ThreadPoolExecutor
 
 from cleo.commands.command import Command
 from cleo.helpers import argument, option
-from requests import RequestException
-from urllib3.exceptions import HTTPError
 
 from superelixier import configuration
 from superelixier.commands.self_upgrade import SelfUpgrade
-from superelixier.generic.generic_manager import GenericManager
+from superelixier.generic.check_engine import CheckEngine
 from superelixier.helper.converters import create_app_jobs
 from superelixier.helper.environment import DIR_APP
+from superelixier.network.session import http_session
 
 
 class CheckDefinitions(Command):
@@ -35,15 +33,15 @@ class CheckDefinitions(Command):
         ret_code = 0
         arg_apps = self.argument("apps")
         op_s = self.option("static")
+        if not op_s:
+            http_session.prewarm()
         if not arg_apps:
             arg_apps = configuration.definitions.keys()
         app_jobs = create_app_jobs(arg_apps, os.path.join(DIR_APP, ".tmp"), self)
         width = max(len(i.name) for i in app_jobs)
         if not op_s:
             ok = []
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                for project in app_jobs:
-                    executor.submit(self.__check_update_status, project)
+            CheckEngine(app_jobs).run()
             for app in (*app_jobs,):
                 p = (width - len(app.name)) * " "
                 match app.update_status:
@@ -53,6 +51,9 @@ class CheckDefinitions(Command):
                     case "failed":
                         self.line_error(f"<fg=red>{app.name}</>:{p} [!] Could not connect to URL or API")
                         continue
+                    case "timed_out":
+                        self.line_error(f"<fg=red>{app.name}</>:{p} [!] Check timed out")
+                        continue
                 if not app.version_latest.blobs:
                     ret_code = 1
                     self.line_error(
@@ -72,12 +73,3 @@ class CheckDefinitions(Command):
                 self.line(f"OK definitions:{n}- {f'{n}- '.join(ok)}")
             SelfUpgrade.notify_update(None, command=self)
             return ret_code
-
-    @classmethod
-    def __check_update_status(cls, project):
-        # TODO: Duplicate code, refactor
-        try:
-            project.execute()
-            GenericManager.check_update(project)
-        except (RequestException, HTTPError):
-            project.update_status = "failed"
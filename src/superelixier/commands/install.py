@@ -6,21 +6,20 @@ If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import textwrap
-from concurrent.futures import ThreadPoolExecutor
 
 from cleo.commands.command import Command
 from cleo.helpers import argument, option
-from requests import RequestException
-from urllib3.exceptions import HTTPError
 
 from superelixier import configuration
 from superelixier.commands.self_upgrade import SelfUpgrade
 from superelixier.configuration import InvalidLocalException, MissingLocalException
-from superelixier.file_handler import FileHandler
-from superelixier.generic.generic_manager import GenericManager
+from superelixier.file_handler.pipeline import UpgradePipeline
+from superelixier.generic.check_engine import CheckEngine
+from superelixier.generic.generic_app import GenericApp
 from superelixier.helper.converters import create_app_jobs
 from superelixier.helper.terminal import DENT, Ansi, print_header
 from superelixier.helper.types import UpdateStatus
+from superelixier.network.session import http_session
 
 
 class Install(Command):
@@ -73,10 +72,9 @@ class Install(Command):
             )
             self.line("Only one default folder is possible!")
             return -100
+        http_session.prewarm()
         app_jobs = create_app_jobs(arg_apps, op_de, self)
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            for project in app_jobs:
-                executor.submit(self.__check_update_status, project)
+        CheckEngine(app_jobs).run()
         should_update: set[UpdateStatus]
         match op_u, op_f:
             case _, True:
@@ -90,7 +88,7 @@ class Install(Command):
         for app in (*app_jobs,):
             if app.update_status == "installed_newer":
                 is_installed_newer_case = True
-            if app.update_status in {"error", "failed", "unknown"}:
+            if app.update_status in {"error", "failed", "timed_out", "unknown"}:
                 app_jobs.remove(app)
                 self.line_error(f"{app.name}: Something went wrong")
                 continue
@@ -142,32 +140,25 @@ class Install(Command):
                 )
             )
 
-        for app in app_jobs:
-            if not app.version_latest.blobs:
-                print_header(app.name, Ansi.RED)
-                self.line_error(
-                    f"Definition problem: no matching downloads for version ID {app.version_latest.version_id}"
-                )
-            elif op_d:
-                for blob in app.version_latest.blobs:
-                    print_header(app.name, Ansi.MAGENTA)
-                    self.line(f"Would download: {blob}")
-            else:
-                my_fh = FileHandler(app)
-                if app.update_status == "not_installed":
-                    print_header(app.name, Ansi.GREEN)
-                    my_fh.project_install()
+        with UpgradePipeline(on_start=self.__announce_install) as pipeline:
+            for app in app_jobs:
+                if not app.version_latest.blobs:
+                    print_header(app.name, Ansi.RED)
+                    self.line_error(
+                        f"Definition problem: no matching downloads for version ID {app.version_latest.version_id}"
+                    )
+                elif op_d:
+                    for blob in app.version_latest.blobs:
+                        print_header(app.name, Ansi.MAGENTA)
+                        self.line(f"Would download: {blob}")
                 else:
-                    print_header(app.name, Ansi.CYAN)
-                    my_fh.project_update()
+                    pipeline.submit(app)
         SelfUpgrade.notify_update(None, command=self)
         return 0
 
     @classmethod
-    def __check_update_status(cls, project):
-        # TODO: Duplicate code, refactor
-        try:
-            project.execute()
-            GenericManager.check_update(project)
-        except (RequestException, HTTPError):
-            project.update_status = "failed"
+    def __announce_install(cls, app: GenericApp) -> None:
+        if app.update_status == "not_installed":
+            print_header(app.name, Ansi.GREEN)
+        else:
+            print_header(app.name, Ansi.CYAN)
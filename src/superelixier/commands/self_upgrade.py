@@ -11,7 +11,6 @@ import textwrap
 from typing import Optional
 from zipfile import ZipFile
 
-import requests as rest
 from cleo.commands.command import Command
 from dateutil import parser
 from packaging import version
@@ -22,6 +21,7 @@ from urllib3.exceptions import HTTPError
 from superelixier import __version_obj__
 from superelixier.file_handler import Downloader
 from superelixier.github import GITHUB_API
+from superelixier.github.github_app import RESPONSE_CACHE
 from superelixier.helper.environment import DIR_APP
 from superelixier.helper.terminal import DENT, Ansi, clear
 
@@ -105,13 +105,11 @@ class SelfUpgrade(Command):
             command = self
         NOTHING = (None, None, None)
         try:
-            releases_api = rest.get(f"{GITHUB_API}/repos/{USER}/{REPO}/releases", headers=HEADERS)
-            releases = json.loads(releases_api.text)
-            if releases_api.status_code != 200:
+            releases_api, releases = RESPONSE_CACHE.get(f"{GITHUB_API}/repos/{USER}/{REPO}/releases", headers=HEADERS)
+            if releases is None:
+                message = json.loads(releases_api.text)["message"]
                 command.line(
-                    Ansi.ERROR
-                    + f"Self update check: HTTP Status {releases_api.status_code}: {releases['message']}"
-                    + Ansi.RESET
+                    Ansi.ERROR + f"Self update check: HTTP Status {releases_api.status_code}: {message}" + Ansi.RESET
                 )
                 return (*NOTHING,)
         except (json.JSONDecodeError, RequestException, HTTPError) as e:
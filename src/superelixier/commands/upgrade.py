@@ -8,23 +8,22 @@ You can obtain one at https://mozilla.org/MPL/2.0/.
 import os
 import sys
 import textwrap
-from concurrent import futures
 from typing import get_args
 
 from cleo.commands.command import Command
-from requests import RequestException
-from urllib3.exceptions import HTTPError
 
 from superelixier import configuration
 from superelixier.commands.self_upgrade import SelfUpgrade
 from superelixier.configuration import InvalidLocalException, MissingLocalException
-from superelixier.file_handler import FileHandler
+from superelixier.file_handler.pipeline import UpgradePipeline
+from superelixier.generic.check_engine import CheckEngine
 from superelixier.generic.generic_app import GenericApp
-from superelixier.generic.generic_manager import GenericManager
 from superelixier.helper.converters import create_app_jobs
 from superelixier.helper.filesystem import make_path_native, remove_empty_dirs
 from superelixier.helper.terminal import DENT, Ansi, clear, print_header
-from superelixier.helper.types import UpdateStatus
+from superelixier.helper.types import CheckMode, UpdateStatus
+from superelixier.network.cancellation import cancel_all
+from superelixier.network.session import http_session
 
 UX_INSTALLED_NEWER = f"""\
 Installed is newer.
@@ -39,17 +38,25 @@ class Upgrade(Command):
     name = "upgrade"
     description = "Upgrade all apps specified in your configuration (default command)"
     # Upgrade
-    job_list = []
-    mt_on = True
+    check_mode: CheckMode = "async"
 
     # logic
     def handle(self) -> int:
         clear()
         _ = configuration.auth  # Check authentication
         ret_code = 0
-        for call in (self.__check_updates, self.__update_apps, self.__pre_exit_cleanup):
+        try:
+            # Apps are downloaded and updated while the checks for other apps are still running
+            with UpgradePipeline(on_start=self.__announce_update) as pipeline:
+                self.__pipeline = pipeline
+                ret_code = self.__check_updates() or 0
             if ret_code == 0:
-                ret_code = call() or 0
+                ret_code = self.__pre_exit_cleanup() or 0
+        except KeyboardInterrupt:
+            cancel_all()
+            self.line_error("Cancelled.")
+            self.__pre_exit_cleanup()
+            return 130
         if len(sys.argv) == 1 and ret_code == 0:  # "oneclick mode", successful: still ask for exit confirmation.
             ret_code = 10
         SelfUpgrade.notify_update(_, command=self)
@@ -64,48 +71,29 @@ class Upgrade(Command):
             for arg in e.args:
                 self.line(textwrap.indent(arg, DENT))
             return -100
+        http_session.prewarm()
         for item in configuration.local.values():
             app_jobs += create_app_jobs(item.apps, item.path, self)
-        if self.mt_on:
-            with futures.ThreadPoolExecutor(max_workers=8) as executor:
-                projects = {executor.submit(self.__report_update_status, project): project for project in app_jobs}
-                for appconf in futures.as_completed(projects):
-                    self.line(appconf.result())
-                    if projects[appconf].update_status in UPDATE_TRIGGER:
-                        self.job_list.append(projects[appconf])
-        else:
-            for appconf in app_jobs:
-                self.line(self.__report_update_status(appconf))
-                if appconf.update_status in UPDATE_TRIGGER:
-                    self.job_list.append(appconf)
+        CheckEngine(app_jobs, self.check_mode).run(self.__report_update_status)
 
-    @classmethod
-    def __report_update_status(cls, project) -> str:
-        try:
-            project.execute()
-            GenericManager.check_update(project)
-        except (RequestException, HTTPError):
-            project.update_status = "failed"
-        finally:
-            return cls.project_status_report(project)
+    def __report_update_status(self, project: GenericApp) -> None:
+        self.line(self.project_status_report(project))
+        if project.update_status in UPDATE_TRIGGER:
+            self.__pipeline.submit(project)
 
-    def __update_apps(self):
-        for job in self.job_list:
-            my_fsm = FileHandler(job)
-            message = f"{job.name}: "
-            match job.update_status:
-                case "update":
-                    message += "Updating"
-                    print_header(message, Ansi.GREEN)
-                    my_fsm.project_update()
-                case "no_version_file":
-                    message += "Updating (forced)"
-                    print_header(message, Ansi.MAGENTA)
-                    my_fsm.project_update()
-                case "not_installed":
-                    message += "Installing"
-                    print_header(message, Ansi.CYAN)
-                    my_fsm.project_install()
+    @classmethod
+    def __announce_update(cls, job: GenericApp) -> None:
+        message = f"{job.name}: "
+        match job.update_status:
+            case "update":
+                message += "Updating"
+                print_header(message, Ansi.GREEN)
+            case "no_version_file":
+                message += "Updating (forced)"
+                print_header(message, Ansi.MAGENTA)
+            case "not_installed":
+                message += "Installing"
+                print_header(message, Ansi.CYAN)
 
     @classmethod
     def project_status_report(cls, project: GenericApp):
@@ -131,6 +119,9 @@ class Upgrade(Command):
             case "failed":
                 color = Ansi.RED
                 message = "Could not connect to URL or API"
+            case "timed_out":
+                color = Ansi.RED
+                message = "Check timed out"
             case _:  # "unknown" or bad value
                 assert project.update_status in get_args(UpdateStatus), f"Bad value for {project.update_status=}"
                 color = Ansi.RED
@@ -35,6 +35,8 @@ FN_AUTH = "auth.toml"
 FN_LOCAL = "local.toml"
 FN_LOCAL_EX = "local_example.toml"
 
+NETWORK_OPTIONS = ("pool_connections", "pool_maxsize")  #: Settings of the optional [network] table in local.toml
+
 UX_SAMPLE_LOCAL = f"""\
 [[{Ansi.YELLOW}directory{Ansi.RESET}]]
 {Ansi.YELLOW}default{Ansi.RESET} = true  {Ansi.DIM}# Optional. Only one default folder is possible!{Ansi.RESET}
@@ -94,6 +96,7 @@ class ConfigHandler:
             self.__auth = None
             self.__definitions = None
             self.__local = None
+            self.__network = {}
 
     @property
     def auth(self):
@@ -113,6 +116,18 @@ class ConfigHandler:
             self.__local = self._load_local()
         return deepcopy(self.__local)
 
+    @property
+    def network(self) -> dict[str, int]:
+        """
+        The [network] table of local.toml, as keyword arguments for HTTPSession.configure.
+        Empty if local.toml is missing or invalid. Commands that need the file report that themselves.
+        """
+        try:
+            self.local
+        except (MissingLocalException, InvalidLocalException):
+            return {}
+        return dict(self.__network)
+
     def _load_auth(self) -> Json:
         loc = opj(DIR_CFG, FN_AUTH)
         try:
@@ -134,7 +149,9 @@ class ConfigHandler:
         loc = opj(DIR_CFG, FN_LOCAL)
         try:
             unvalidated = self.__load_toml(loc)
-            return ConfigHandler._validate_local(unvalidated)
+            local = ConfigHandler._validate_local(unvalidated)
+            self.__network = unvalidated.get("network", {})
+            return local
         except TOMLDecodeError:
             raise InvalidLocalException(E_INVALID % FN_LOCAL)
         except OSError:
@@ -220,6 +237,19 @@ class ConfigHandler:
                     {}"""
                 ).format(bulleted)
             )
+        network = cfg_loaded.get("network", {})
+        if not isinstance(network, dict) or not all(
+            key in NETWORK_OPTIONS and isinstance(value, int) and not isinstance(value, bool) and value > 0
+            for key, value in network.items()
+        ):
+            bulleted = "- " + "\n- ".join(NETWORK_OPTIONS)
+            raise InvalidLocalException(
+                textwrap.dedent(
+                    """\
+                    The optional "network" table can only set these options, to whole numbers above zero:
+                    {}"""
+                ).format(bulleted)
+            )
         paths = [i["path"] for i in cfg_loaded["directory"]]
         if len(paths) != len(set(paths)):
             for p in set(paths):
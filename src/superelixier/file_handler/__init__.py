@@ -6,22 +6,35 @@ If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import datetime
+import io
 import json
 import os
 import re
 import shutil
 import subprocess
+from concurrent import futures
+from urllib.parse import urlparse
 
+from superelixier.file_handler.blob_store import shared_store
 from superelixier.file_handler.downloader import Downloader
-from superelixier.file_handler.fs_helper import list_appdatas, lock_folder
+from superelixier.file_handler.extractor import (
+    TAR_SUFFIXES,
+    ExtractPlan,
+    extract_archive,
+    move_tree,
+    wrapper_depth,
+)
+from superelixier.file_handler.fs_helper import list_appdatas, lock_folder, unchanged_files, unlock_folder
+from superelixier.file_handler.manifest import MANIFEST_SPEC, FileRecord, Manifest
 from superelixier.generic.generic_app import GenericApp, VersionInstalled
 from superelixier.helper.environment import DIR_APP
-from superelixier.helper.filesystem import remove_empty_dirs, simple_folder_list
-from superelixier.helper.terminal import Ansi
+from superelixier.helper.filesystem import DirectoryMaker, remove_empty_dirs, scan_files
+from superelixier.helper.terminal import Ansi, output_into
 
 BIN = os.path.join(DIR_APP, "bin-win32")
 SEVENZIP = os.path.join(BIN, "7z.exe")
 INNOEXTRACT = os.path.join(BIN, "innoextract.exe")
+BLOB_WORKERS: int = 4  #: Blobs of one app that are downloaded at the same time
 
 
 class FileHandler:
@@ -33,13 +46,29 @@ class FileHandler:
         self.__keep_history = True
         self.__history = os.path.join(app.appdir, ".superelixier-history", now_string)
         self.__deferred = os.path.join(self.__cache, ".deferred", app.name)
+        self.__downloads_dir = os.path.join(self.__cache, f"{app.random_id}.download")
+        self.__downloads: list[str] = []
+        self.__reused_files = False
+        self.__keep_list: list[str] | None = None
+        self.__manifest: Manifest | None = None
+        self.__blobs: list[str] = list(app.version_latest.blobs) if app.version_latest is not None else []
+        shared_store.want(self.__blobs)
 
-    def __project_download(self):
-        """
-        Handle the download of blobs or check if deferred update matches the latest version on remote site.
+    @property
+    def app(self) -> GenericApp:
+        return self.__app
 
-        :return: False if the directory should be normalized, True if not.
+    def project_download(self) -> None:
+        """
+        Download the blobs or check if deferred update matches the latest version on remote site.
+        First stage of an update or installation.
         """
+        try:
+            self.__project_download()
+        finally:
+            shared_store.release(self.__blobs)
+
+    def __project_download(self) -> None:
         # Check if deferred update files should be leveraged
         version_deferred = os.path.join(self.__deferred, "superelixier.json")
         if os.path.isfile(version_deferred):
@@ -48,34 +77,91 @@ class FileHandler:
             if version_deferred == self.__app.version_latest:
                 print(Ansi.GREEN + self.__app.name + ": Re-using previously downloaded update files")
                 self.__staging = self.__deferred
-                return True
+                self.__reused_files = True
+                return
             else:
                 print(Ansi.GREEN + self.__app.name + ": Previously downloaded update is not latest version, removing")
                 shutil.rmtree(self.__deferred)
-        # Create folder structure if it doesn't exist
-        os.makedirs(self.__staging, exist_ok=True)
-        # Make sure staging directory is empty
-        shutil.rmtree(self.__staging)
-        os.mkdir(self.__staging)
+        # Make sure the download directory exists and is empty
+        if os.path.isdir(self.__downloads_dir):
+            shutil.rmtree(self.__downloads_dir)
+        os.makedirs(self.__downloads_dir)
         release_latest = self.__app.version_latest.blobs
         if len(release_latest) == 0:
             print("No matching downloads for the latest version")
-        for url in release_latest:
-            tmpfile = os.path.join(self.__staging, "download-incomplete")
-            filename = Downloader(url, tmpfile).file
+        # Each blob gets a directory of its own, so blobs with the same file name don't clash
+        with futures.ThreadPoolExecutor(max_workers=min(len(release_latest), BLOB_WORKERS) or 1) as executor:
+            results = list(executor.map(self.__download_blob, range(len(release_latest)), release_latest))
+        # Show the output of each download in one piece, in blob order
+        for filename, output in results:
+            print(output, end="")
+            if filename:
+                self.__downloads.append(filename)
+
+    def __download_blob(self, index: int, url: str) -> tuple[str | None, str]:
+        """
+        :return: The downloaded file and the output of the download
+        """
+        buffer = io.StringIO()
+        with output_into(buffer):
+            tmpfile = os.path.join(self.__downloads_dir, str(index), "download-incomplete")
+            os.makedirs(os.path.split(tmpfile)[0], exist_ok=True)
+            # Tar archives are extracted straight from the download, into a directory named like the archive.
+            # Archives that other jobs want too, or that may be stored already, go through the blob store instead.
+            url_name = urlparse(url).path.split("/")[-1]
+            stream = not shared_store.shared(url) and not shared_store.stores(url)
+            if url_name.casefold().endswith(TAR_SUFFIXES) and stream:
+                extracted = os.path.join(os.path.split(tmpfile)[0], url_name)
+                if Downloader.stream_extract(url, extracted):
+                    return extracted, buffer.getvalue()
+            filename = Downloader(url, tmpfile, os.path.join(self.__cache, "downloads")).file
             if os.path.isfile(tmpfile):
                 os.remove(tmpfile)
-            archives = "001|7z|bz2|bzip2|gz|gzip|lzma|rar|tar|tgz|txz|xz|zip"
-            if self.__app.definition.local.installer == "sfx":
-                archives = f"exe|{archives}"
-            if filename and re.fullmatch(f"^.*\\.({archives})$", filename.casefold()):
-                subprocess.run([SEVENZIP, "x", "-aoa", filename], cwd=self.__staging, stdout=subprocess.DEVNULL)
-                os.remove(os.path.join(self.__staging, filename))
+        return filename, buffer.getvalue()
+
+    def discard(self) -> None:
+        """
+        Remove the downloads and the staging folder of this run, e.g. after cancellation. A deferred update is kept.
+        """
+        for folder in (self.__downloads_dir, self.__staging):
+            if folder != self.__deferred and os.path.isdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
+
+    def project_extract(self) -> None:
+        """
+        Extract the downloaded blobs into the staging directory, in the order of the blob list, and normalize it.
+        Second stage.
+        """
+        if self.__reused_files:
+            return
+        # Create folder structure if it doesn't exist
+        os.makedirs(self.__staging, exist_ok=True)
+        # Make sure staging directory is empty
+        shutil.rmtree(self.__staging)
+        os.mkdir(self.__staging)
+        archives = "001|7z|bz2|bzip2|gz|gzip|lzma|rar|tar|tgz|txz|xz|zip"
+        if self.__app.definition.local.installer == "sfx":
+            archives = f"exe|{archives}"
+        for download in self.__downloads:
+            filename = os.path.split(download)[1]
+            if os.path.isdir(download) or re.fullmatch(f"^.*\\.({archives})$", filename.casefold()):
+                # Unwrapping and filtering members only work out if nothing else is extracted on top of this archive
+                single = len(self.__downloads) == 1
+                if os.path.isdir(download):  # Extracted while downloading
+                    move_tree(FileHandler.__unwrapped(download) if single else download, self.__staging)
+                else:
+                    if not extract_archive(download, self.__staging, self.__extract_plan if single else None):
+                        subprocess.run(
+                            [SEVENZIP, "x", "-aoa", "-mmt=on", download], cwd=self.__staging, stdout=subprocess.DEVNULL
+                        )
+                    os.remove(download)
                 # Handle zipped installer case
                 extracted = os.listdir(self.__staging)
                 if len(extracted) == 1:
                     filename = extracted[0]
-            if filename and filename.casefold().endswith(".exe"):
+            else:
+                os.replace(download, os.path.join(self.__staging, filename))
+            if filename.casefold().endswith(".exe"):
                 if self.__app.definition.local.installer == "innoextract":
                     subprocess.run([INNOEXTRACT, "-n", filename], cwd=self.__staging, stdout=subprocess.DEVNULL)
                     os.remove(os.path.join(self.__staging, filename))
@@ -83,7 +169,87 @@ class FileHandler:
                     os.rename(
                         os.path.join(self.__staging, filename), os.path.join(self.__staging, f"{self.__app.name}.exe")
                     )
-        return False
+        self.__downloads = []
+        remove_empty_dirs(self.__downloads_dir, delete_top=True)
+        self.__project_normalize()
+
+    def __extract_plan(self, names: list[str]) -> ExtractPlan:
+        """
+        Plan extraction straight into the normalized layout, so that __project_normalize has nothing left to move.
+        Folders that wrap everything else are stripped from the member paths. Members that would be removed right
+        after extraction are never written: those matched by the definition's "delete" patterns, and the files that
+        the app's existing appdatas would keep anyway.
+
+        :param names: Member names of the archive, directories ending with "/"
+        """
+        depth = wrapper_depth(names)
+        paths = [name.rstrip("/").split("/") for name in names]
+        # Like __project_normalize, stop at a single file (e.g. a zipped installer) and only strip above several items
+        deletable = len({path[depth] for path in paths if len(path) > depth}) > 1
+        if not deletable:
+            depth = 0
+        delete = [re.compile(pattern) for pattern in self.__app.definition.local.delete] if deletable else []
+        appdatas = {"/".join(os.path.relpath(file, self.__app.appdir).split(os.sep)) for file in self.__appdatas()}
+        excluded = set()
+        for name, path in zip(names, paths):
+            inner = path[depth:]
+            if not inner:
+                continue
+            if any(pattern.fullmatch(inner[0]) for pattern in delete) or "/".join(inner) in appdatas:
+                excluded.add(name)
+        if excluded:
+            print(f"{self.__app.name}: Leaving out {len(excluded)} archive members (delete patterns and appdatas)")
+        return ExtractPlan(strip=depth, exclude=excluded)
+
+    @classmethod
+    def __unwrapped(cls, directory: str) -> str:
+        """
+        :return: The innermost folder that holds several items, below folders that hold nothing but one folder
+        """
+        while len(items := os.listdir(directory)) == 1 and os.path.isdir(inner := os.path.join(directory, items[0])):
+            contents = os.listdir(inner)
+            if len(contents) < 2 and not all(os.path.isdir(os.path.join(inner, item)) for item in contents):
+                break  # Keep a single file in its folder, like the archives extracted by __extract_plan
+            directory = inner
+        return directory
+
+    def __appdatas(self) -> list[str]:
+        """
+        Files of the installed app that are kept on update.
+        """
+        if self.__keep_list is None:
+            self.__keep_list = list_appdatas(self.__app) if self.__app.update_status != "not_installed" else []
+        return self.__keep_list
+
+    def __installed_manifest(self) -> Manifest | None:
+        """
+        Records of the installed files, read on first use. None for apps installed without a manifest.
+        """
+        installed = self.__app.version_installed
+        if self.__manifest is None and installed is not None and installed.spec >= MANIFEST_SPEC:
+            self.__manifest = Manifest.load(self.__app.appdir)
+        return self.__manifest
+
+    def project_apply(self) -> None:
+        """
+        Move the new files into the app folder. Last stage.
+        """
+        if self.__app.update_status == "not_installed":
+            self.__apply_install()
+        else:
+            self.__apply_update()
+
+    def __apply_update(self):
+        if not self.__project_merge_oldnew():
+            self.__defer_update()
+        self.__post_install()
+
+    def __apply_install(self):
+        if os.listdir(self.__staging):
+            staged = scan_files(self.__staging)
+            Manifest({file: FileRecord.of(stat) for file, stat in staged.items()}).save(self.__staging)
+            os.rename(self.__staging, self.__app.appdir)
+        self.__post_install()
 
     def __project_normalize(self):
         normalize_failure = False
@@ -131,45 +297,71 @@ class FileHandler:
 
     def __project_merge_oldnew(self):
         # Data to keep
-        keep_list = list_appdatas(self.__app)
-        # Full dir tree list
-        full_list = simple_folder_list(self.__staging)
-        # Lock all files
-        opened_files = lock_folder(self.__app, self.__staging, full_list)
+        keep_list = {os.path.relpath(file, self.__app.appdir) for file in self.__appdatas()}
+        # Full dir trees, relative to staging and app folder
+        staged = scan_files(self.__staging)
+        full_list = set(staged)
+        manifest = self.__installed_manifest()
+        if manifest is not None:
+            installed = dict(manifest.files)
+            # Files that the updater didn't put there, e.g. created by the app, are looked up one by one
+            for file in full_list - installed.keys():
+                if os.path.isfile(installed_file := os.path.join(self.__app.appdir, file)):
+                    installed[file] = FileRecord.of(os.stat(installed_file))
+        else:
+            history = os.path.relpath(os.path.split(self.__history)[0], self.__app.appdir)
+            installed = {file: FileRecord.of(stat) for file, stat in scan_files(self.__app.appdir, [history]).items()}
+        # Remove appdatas from staging
+        for file in keep_list & full_list:
+            file_to_protect = os.path.join(self.__staging, file)
+            try:
+                os.remove(file_to_protect)
+                full_list.remove(file)
+            except PermissionError:
+                raise PermissionError(f"Error updating {self.__app.name}: Permission denied for {file_to_protect}")
+        # Leave unchanged files in place, and out of the history
+        unchanged = unchanged_files(self.__app, self.__staging, {file: staged[file] for file in full_list}, installed)
+        for file in unchanged:
+            os.remove(os.path.join(self.__staging, file))
+        full_list -= unchanged.keys()
+        if unchanged:
+            print(f"{self.__app.name}: {len(unchanged)} files unchanged, {len(full_list)} to move")
+        # Lock all files that will be replaced
+        opened_files = lock_folder(self.__app, full_list & installed.keys())
         if opened_files is None:
             return False
-        # Remove appdatas from staging
-        for file in keep_list:
-            file_to_protect = file.replace(self.__app.appdir, self.__staging)
-            if file_to_protect in full_list:
-                try:
-                    os.remove(file_to_protect)
-                    full_list.remove(file_to_protect)
-                except PermissionError:
-                    raise PermissionError(f"Error updating {self.__app.name}: Permission denied for {file_to_protect}")
-        # Create history folder
-        if self.__keep_history:
-            os.makedirs(self.__history, exist_ok=True)
-        # Move to new location
-        for update_file in full_list:
-            stage_location = update_file
-            new_location = update_file.replace(self.__staging, self.__app.appdir)
-            os.makedirs(os.path.split(new_location)[0], exist_ok=True)
-            if os.path.exists(new_location):
-                if self.__keep_history:
-                    history_location = new_location.replace(self.__app.appdir, self.__history)
-                    os.makedirs(os.path.split(history_location)[0], exist_ok=True)
-                    # close file
-                    if new_location in opened_files:
-                        opened_files[new_location].close()
-                    os.rename(new_location, history_location)
-                    os.rename(stage_location, new_location)
+        try:
+            # Create history folder
+            if self.__keep_history:
+                os.makedirs(self.__history, exist_ok=True)
+            directories = DirectoryMaker()
+            # Move to new location
+            for update_file in sorted(full_list):
+                stage_location = os.path.join(self.__staging, update_file)
+                new_location = os.path.join(self.__app.appdir, update_file)
+                directories.makedirs(os.path.split(new_location)[0])
+                if update_file in installed:
+                    if self.__keep_history:
+                        history_location = os.path.join(self.__history, update_file)
+                        directories.makedirs(os.path.split(history_location)[0])
+                        # close file
+                        if new_location in opened_files:
+                            opened_files[new_location].close()
+                        try:
+                            os.rename(new_location, history_location)
+                        except FileNotFoundError:  # Recorded in the manifest, but removed since
+                            pass
+                        os.rename(stage_location, new_location)
+                    else:
+                        os.replace(stage_location, new_location)
                 else:
-                    os.replace(stage_location, new_location)
-            else:
-                os.rename(stage_location, new_location)
-        for key in opened_files:
-            opened_files[key].close()
+                    os.rename(stage_location, new_location)
+        finally:
+            unlock_folder(opened_files)
+        # Record what the updater has put into the app folder, so that the next update doesn't have to walk it
+        records = {**(manifest.files if manifest is not None else {}), **unchanged}
+        records.update({file: FileRecord.of(staged[file]) for file in full_list})
+        Manifest({file: record for file, record in records.items() if file not in keep_list}).save(self.__app.appdir)
         remove_empty_dirs(self.__staging)
         # Ideally don't create these folders in the first place:
         remove_empty_dirs(os.path.split(self.__history)[0], delete_top=True)
@@ -195,17 +387,11 @@ class FileHandler:
             os.makedirs(os.path.join(self.__app.appdir, "data"), exist_ok=True)
 
     def project_update(self):
-        reused_files = self.__project_download()
-        if not reused_files:
-            self.__project_normalize()
-        if not self.__project_merge_oldnew():
-            self.__defer_update()
-        self.__post_install()
+        self.project_download()
+        self.project_extract()
+        self.__apply_update()
 
     def project_install(self):
-        reused_files = self.__project_download()
-        if not reused_files:
-            self.__project_normalize()
-        if os.listdir(self.__staging):
-            os.rename(self.__staging, self.__app.appdir)
-        self.__post_install()
+        self.project_download()
+        self.project_extract()
+        self.__apply_install()
@@ -0,0 +1,203 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from requests import Response
+
+from superelixier.helper.environment import DIR_CACHE
+from superelixier.helper.filesystem import atomic_write
+from superelixier.network.cancellation import check_cancelled
+
+__all__ = ["BlobStore", "shared_store"]
+
+DIR_BLOBS: str = os.path.join(DIR_CACHE, "blobs")
+MAX_STORE_SIZE: int = 4 * 1024**3  #: Least recently used blobs are evicted above this size
+HASH_CHUNK: int = 1024**2
+POLL_INTERVAL: float = 0.5
+
+
+class BlobStore:
+    """
+    Downloaded blobs, shared by all target directories. The files are named after their SHA-256 and found through
+    an index keyed by URL and ETag (or size), so the same release asset is only downloaded once even if the app is
+    installed in several places. Hand-off to a staging directory is a hard link, or a copy where linking fails.
+
+    Jobs announce the URLs they are going to download with want(). A blob is only stored if another job still wants
+    it, and downloads of the same URL run one at a time, so that the later ones find the blob of the first.
+    """
+
+    __state = {}
+
+    def __init__(self):
+        self.__dict__ = self.__state
+        if self.__state == {}:
+            self.__lock = threading.Lock()
+            self.__index_file = os.path.join(DIR_BLOBS, "index.json")
+            self.__index: dict[str, dict] | None = None
+            self.__wanted: Counter[str] = Counter()
+            self.__flights: dict[str, threading.Lock] = {}
+
+    @classmethod
+    def key(cls, url: str, response: Response) -> str | None:
+        """
+        :param url: URL the download was started from, before redirects
+        :param response: Response to the download request
+        :return: Key of the blob, or None if the response carries nothing to tell versions of the file apart
+        """
+        version = response.headers.get("etag") or response.headers.get("content-length")
+        return None if not version else f"{url} {version}"
+
+    def want(self, urls: Iterable[str]) -> None:
+        """
+        Announce a job that is going to download the URLs.
+        """
+        with self.__lock:
+            self.__wanted.update(urls)
+
+    def release(self, urls: Iterable[str]) -> None:
+        """
+        The job is done with the URLs, whether it downloaded them or not.
+        """
+        with self.__lock:
+            self.__wanted.subtract(urls)
+
+    def shared(self, url: str) -> bool:
+        """
+        :return: True if more than one pending job wants the URL, so that its download is worth storing
+        """
+        with self.__lock:
+            return self.__wanted[url] > 1
+
+    def stores(self, url: str) -> bool:
+        """
+        :return: True if a version of the URL's file is stored. Whether it is the current one takes a request to tell.
+        """
+        with self.__lock:
+            return any(key.startswith(f"{url} ") for key in self.__load())
+
+    @contextmanager
+    def downloading(self, url: str) -> Iterator[None]:
+        """
+        Hold back other downloads of the URL until this one is done.
+        """
+        with self.__lock:
+            flight = self.__flights.setdefault(url, threading.Lock())
+        while not flight.acquire(timeout=POLL_INTERVAL):
+            check_cancelled()
+        try:
+            yield
+        finally:
+            flight.release()
+
+    def fetch(self, key: str | None, target: str) -> bool:
+        """
+        Put the stored blob at target.
+
+        :return: False if the blob isn't stored or failed verification
+        """
+        if key is None:
+            return False
+        with self.__lock:
+            entry = self.__load().get(key)
+        if entry is None:
+            return False
+        path = os.path.join(DIR_BLOBS, entry["sha256"])
+        if not os.path.isfile(path) or BlobStore.__sha256(path) != entry["sha256"]:
+            self.__forget(key)
+            return False
+        if os.path.isfile(target):
+            os.remove(target)
+        BlobStore.__link_or_copy(path, target)
+        with self.__lock:
+            entry["last_used"] = time.time()
+            self.__save()
+        return True
+
+    def add(self, key: str | None, file: str, url: str) -> None:
+        """
+        Store a downloaded file, if another job wants it too. Evicts the least recently used blobs if the store gets
+        too large.
+
+        :param url: URL the download was started from
+        """
+        if key is None or not self.shared(url):
+            return
+        try:
+            sha256 = BlobStore.__sha256(file)
+            path = os.path.join(DIR_BLOBS, sha256)
+            if not os.path.isfile(path):
+                os.makedirs(DIR_BLOBS, exist_ok=True)
+                with atomic_write(path) as tmp:
+                    BlobStore.__link_or_copy(file, tmp)
+        except OSError:
+            return
+        with self.__lock:
+            self.__load()[key] = {"sha256": sha256, "size": os.path.getsize(path), "last_used": time.time()}
+            self.__evict()
+            self.__save()
+
+    def __evict(self) -> None:
+        entries = sorted(self.__index.items(), key=lambda item: item[1]["last_used"])
+        total = sum(entry["size"] for entry in {entry["sha256"]: entry for _, entry in entries}.values())
+        while total > MAX_STORE_SIZE and entries:
+            key, entry = entries.pop(0)
+            del self.__index[key]
+            if all(other["sha256"] != entry["sha256"] for _, other in entries):  # Not shared with another key
+                total -= entry["size"]
+                path = os.path.join(DIR_BLOBS, entry["sha256"])
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def __forget(self, key: str) -> None:
+        with self.__lock:
+            self.__load().pop(key, None)
+            self.__save()
+
+    def __load(self) -> dict[str, dict]:
+        if self.__index is None:
+            try:
+                with open(self.__index_file, "r", encoding="utf-8") as fd:
+                    self.__index = json.load(fd)
+            except (OSError, ValueError):
+                self.__index = {}
+        return self.__index
+
+    def __save(self) -> None:
+        try:
+            os.makedirs(DIR_BLOBS, exist_ok=True)
+            with atomic_write(self.__index_file) as tmp:
+                with open(tmp, "w", encoding="utf-8") as fd:
+                    json.dump(self.__index, fd)
+        except OSError:
+            pass
+
+    @classmethod
+    def __link_or_copy(cls, source: str, target: str) -> None:
+        try:
+            os.link(source, target)
+        except OSError:  # Different volume, or a file system without hard links
+            shutil.copyfile(source, target)
+
+    @classmethod
+    def __sha256(cls, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as fd:
+            while chunk := fd.read(HASH_CHUNK):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+shared_store = BlobStore()
@@ -8,23 +8,73 @@ You can obtain one at https://mozilla.org/MPL/2.0/.
 import html
 import os
 import re
+import shutil
 import string
+import tarfile
+import threading
+import time
+from concurrent import futures
+from dataclasses import dataclass, field
+from typing import Callable
 from urllib.parse import urlparse, urlunparse
 
-import requests
 from requests import RequestException
 from urllib3.exceptions import HTTPError
 
+from superelixier.file_handler.blob_store import BlobStore, shared_store
+from superelixier.file_handler.extractor import extract_tar_stream
+from superelixier.file_handler.partial_download import PartialDownload
 from superelixier.helper.terminal import Ansi
 from superelixier.html_page import HEADERS
+from superelixier.network.cancellation import CancelledException, cancel_all, check_cancelled
+from superelixier.network.session import http_session
+
+MIN_BUFFER: int = 64 * 1024  #: First read size. It doubles while reads fill the buffer.
+MAX_BUFFER: int = 4 * 1024**2
+RANGE_CONNECTIONS: int = 4  #: Connections used for one ranged download
+RANGE_MIN_SIZE: int = 16 * 1024**2  #: Smaller files are downloaded over a single connection
+RETRIES: int = 4  #: How often an interrupted download is resumed
+BACKOFF: float = 2  #: Seconds before the first retry, doubled for every further retry
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RangesIgnoredException(Exception):
+    pass
+
+
+@dataclass
+class TransferStats:
+    """
+    Where the time of a download goes. If writing takes a large share, the disk is the bottleneck, not the network.
+    """
+
+    size: int = 0
+    read_time: float = 0
+    write_time: float = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, size: int, read_time: float, write_time: float) -> None:
+        with self._lock:
+            self.size += size
+            self.read_time += read_time
+            self.write_time += write_time
+
+    def report(self, elapsed: float) -> str:
+        mib = self.size / 1024**2
+        busy = self.read_time + self.write_time
+        writing = f", {self.write_time / busy:.0%} of it writing" if busy else ""
+        return f"Downloaded {mib:.1f} MiB in {elapsed:.1f} s ({mib / max(elapsed, 1e-6):.1f} MiB/s{writing})"
 
 
 class Downloader:
-    def __init__(self, url, target):
-        self._file = Downloader.__url_downloader(url, target)
+    def __init__(self, url, target, partial_dir: str = None):
+        """
+        :param partial_dir: Where interrupted downloads are kept for later runs. Defaults to the folder of target.
+        """
+        self._file = Downloader.__url_downloader(url, target, partial_dir or os.path.split(target)[0])
 
     @classmethod
-    def __url_downloader(cls, url, target) -> str | None:
+    def __url_downloader(cls, url, target, partial_dir: str) -> str | None:
         """
         curl without curl
 
@@ -33,14 +83,71 @@ class Downloader:
         """
         print(f"Downloading file from: {url}")
         try:
-            url, response = Downloader.__handle_redirects(url, target)
-            Downloader.__write_response(response, target)
-            filename = os.path.join(os.path.split(target)[0], Downloader.__get_remote_filename(url, response))
-            os.rename(target, filename)
-            return filename
-        except (RequestException, HTTPError, ValueError):
+            with shared_store.downloading(url):  # Other jobs for the same URL get the blob from the store then
+                return Downloader.__download(url, target, partial_dir)
+        except CancelledException:
             return None
 
+    @classmethod
+    def __download(cls, url, target, partial_dir: str) -> str | None:
+        source, start, stats = url, time.perf_counter(), TransferStats()
+        for attempt in range(RETRIES + 1):
+            if attempt:
+                delay = BACKOFF * 2 ** (attempt - 1)
+                print(f"{Ansi.MAGENTA}Download interrupted, resuming in {delay:.0f} s{Ansi.RESET}")
+                time.sleep(delay)
+            try:
+                url, response = Downloader.__handle_redirects(source, target)
+                filename = os.path.join(os.path.split(target)[0], Downloader.__get_remote_filename(url, response))
+                key = BlobStore.key(source, response)
+                if shared_store.fetch(key, filename):
+                    response.close()
+                    print("Re-using the file downloaded before")
+                    return filename
+                with PartialDownload.claimed(source, partial_dir) as owned:
+                    if owned:
+                        Downloader.__write_resumable(source, response, target, stats, partial_dir)
+                    else:  # Another download of the same file is running, and owns its partial file
+                        Downloader.__write_response(response, target, stats)
+                os.rename(target, filename)
+                shared_store.add(key, filename, source)
+                print(stats.report(time.perf_counter() - start))
+                return filename
+            except CancelledException:
+                return None
+            except (RequestException, HTTPError, OSError):
+                continue
+            except ValueError:
+                return None
+        print(Ansi.ERROR + "Download failed")
+        return None
+
+    @classmethod
+    def stream_extract(cls, url, destination) -> bool:
+        """
+        Extract a tar archive while it downloads, without writing the archive to disk.
+
+        :return: False if it didn't work out. The destination is removed then.
+        """
+        print(f"Downloading and extracting: {url}")
+        start = time.perf_counter()
+        response = None
+        try:
+            response = http_session.get(url, allow_redirects=True, headers=HEADERS, stream=True)
+            if response.status_code != 200 or "text/html" in response.headers.get("content-type", "").lower():
+                return False
+            response.raw.decode_content = True
+            extract_tar_stream(response.raw, destination)
+        except (RequestException, HTTPError, tarfile.TarError, EOFError, OSError):
+            if os.path.isdir(destination):
+                shutil.rmtree(destination)
+            return False
+        finally:
+            if response is not None:
+                response.close()
+        print(f"Extracted in {time.perf_counter() - start:.1f} s")
+        return True
+
     @classmethod
     def __handle_redirects(cls, url, dl_file):
         """
@@ -49,10 +156,12 @@ class Downloader:
         :param url:
         :return response:
         """
-        response = requests.get(url, allow_redirects=True, headers=HEADERS, stream=True)
+        response = http_session.get(url, allow_redirects=True, headers=HEADERS, stream=True)
         if response.status_code != 200:
             print(Ansi.ERROR + "Download failed, HTTP status %s: %s" % (response.status_code, response.reason))
-            raise HTTPError
+            if response.status_code in RETRY_STATUS:
+                raise HTTPError
+            raise ValueError
         else:
             if response.headers.get("refresh"):
                 old_url = url
@@ -90,10 +199,161 @@ class Downloader:
         return url, response
 
     @classmethod
-    def __write_response(cls, response, file):
+    def __write_response(cls, response, file, stats: TransferStats = None):
+        length = response.headers.get("content-length", "")
         with open(file, "wb") as fd:
-            for chunk in response.iter_content(chunk_size=1024):
-                fd.write(chunk)
+            if length.isdigit():
+                fd.truncate(int(length))  # Preallocate
+            Downloader.__copy(response, fd, stats or TransferStats())
+            fd.truncate()  # The length is that of the encoded body, if there is a content encoding
+
+    @classmethod
+    def __copy(cls, response, fd, stats: TransferStats, limit: int = None, on_write: Callable[[int], None] = None):
+        """
+        Write the response body to fd through a reused buffer.
+
+        :param limit: Stop after this many bytes
+        :param on_write: Called with the size of each write
+        """
+        buffer = memoryview(bytearray(MAX_BUFFER))
+        if response.headers.get("content-encoding", "identity").lower() == "identity":
+
+            def read_chunk(wanted: int) -> memoryview:
+                return buffer[: response.raw.readinto(buffer[:wanted])]
+
+        else:  # urllib3 can't readinto while decoding. Ranges are never encoded, so limit doesn't apply here.
+            chunks = response.iter_content(MAX_BUFFER)
+
+            def read_chunk(_: int) -> bytes:
+                return next(chunks, b"")
+
+        size = MIN_BUFFER
+        while limit is None or limit > 0:
+            check_cancelled()
+            wanted = size if limit is None else min(size, limit)
+            started = time.perf_counter()
+            chunk = read_chunk(wanted)
+            read = time.perf_counter()
+            length = len(chunk)
+            if not length:
+                break
+            fd.write(chunk)
+            stats.add(length, read - started, time.perf_counter() - read)
+            if on_write is not None:
+                on_write(length)
+            if limit is not None:
+                limit -= length
+            if length == wanted and size < MAX_BUFFER:
+                size *= 2
+
+    @classmethod
+    def __range_size(cls, response) -> int | None:
+        """
+        :return: The file size, if the file can be downloaded in ranges
+        """
+        headers = response.headers
+        if headers.get("accept-ranges", "").lower() != "bytes":
+            return None
+        if headers.get("content-encoding", "identity").lower() != "identity":
+            return None
+        length = headers.get("content-length", "")
+        return int(length) if length.isdigit() else None
+
+    @classmethod
+    def __write_resumable(cls, source, response, file, stats: TransferStats, directory: str):
+        """
+        Continue an earlier download of the file, if the server still has the same version of it.
+        Large files are downloaded in ranges over several connections.
+        The caller must hold PartialDownload.claimed for the source.
+
+        :param source: URL the download was started from
+        :param directory: Folder with the partial downloads
+        """
+        size = Downloader.__range_size(response)
+        validator = response.headers.get("etag") or response.headers.get("last-modified")
+        if size is None or not validator:  # Can't be resumed
+            PartialDownload.discard(source, directory)
+            Downloader.__write_response(response, file, stats)
+            return
+        partial = PartialDownload.load(source, directory)
+        if partial is None or partial.validator != validator or partial.size != size:
+            partial = PartialDownload.create(
+                source, directory, validator, size, RANGE_CONNECTIONS if size >= RANGE_MIN_SIZE else 1
+            )
+        elif partial.downloaded:
+            print(f"Resuming download at {partial.downloaded / size:.0%}")
+        if len(partial.ranges) == 1 and not partial.downloaded:
+            # Nothing to resume and nothing to split: the first response already is the whole range
+            try:
+                with open(partial.path, "r+b") as fd:
+                    Downloader.__copy(response, fd, stats, size, lambda length: partial.advance(0, length))
+            finally:
+                response.close()
+                partial.save()
+            if not partial.complete:  # The connection ended early. The retry resumes from here.
+                raise HTTPError
+            Downloader.__finish(partial, file)
+            return
+        url = response.url  # Skip the redirects
+        response.close()
+        try:
+            with futures.ThreadPoolExecutor(max_workers=len(partial.ranges) or 1) as executor:
+                jobs = [
+                    executor.submit(Downloader.__write_range, url, partial, index, stats)
+                    for index, (_, last, next_byte) in enumerate(partial.ranges)
+                    if next_byte <= last
+                ]
+                for job in futures.as_completed(jobs):
+                    job.result()
+        except KeyboardInterrupt:
+            cancel_all()  # Let the other ranges stop and save their progress
+            raise
+        except RangesIgnoredException:
+            print(f"{Ansi.WARNING}Ranged download failed, retrying over a single connection{Ansi.RESET}")
+            PartialDownload.discard(source, directory)
+            response = http_session.get(url, headers=HEADERS, stream=True)
+            if response.status_code != 200:
+                print(Ansi.ERROR + "Download failed, HTTP status %s: %s" % (response.status_code, response.reason))
+                raise HTTPError
+            Downloader.__write_response(response, file, stats)
+            return
+        finally:
+            partial.save()
+        Downloader.__finish(partial, file)
+
+    @classmethod
+    def __finish(cls, partial: PartialDownload, file) -> None:
+        if not partial.complete or os.path.getsize(partial.path) != partial.size:
+            print(Ansi.ERROR + "Download failed, file is incomplete")
+            PartialDownload.discard(partial.url, partial.directory)
+            raise HTTPError
+        partial.finish(file)
+
+    @classmethod
+    def __write_range(cls, url, partial: PartialDownload, index: int, stats: TransferStats):
+        """
+        Download the rest of a range into the partial file.
+        """
+        _, last, next_byte = partial.ranges[index]
+        # If-Range: the server sends the whole file instead, if it has changed meanwhile
+        headers = {**HEADERS, "Range": f"bytes={next_byte}-{last}", "If-Range": partial.validator}
+        response = http_session.get(url, headers=headers, stream=True)
+        try:
+            if response.status_code == 200:
+                if (response.headers.get("etag") or response.headers.get("last-modified")) == partial.validator:
+                    raise RangesIgnoredException
+                PartialDownload.discard(partial.url, partial.directory)  # A new version: start over
+                raise HTTPError
+            content_range = response.headers.get("content-range", "")
+            if response.status_code != 206 or not content_range.startswith(f"bytes {next_byte}-{last}/"):
+                raise HTTPError
+            with open(partial.path, "r+b") as fd:
+                fd.seek(next_byte)
+                Downloader.__copy(
+                    response, fd, stats, last + 1 - next_byte, lambda length: partial.advance(index, length)
+                )
+        finally:
+            response.close()
 
     @classmethod
     def normalize_url(cls, url, source=None):
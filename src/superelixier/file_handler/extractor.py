@@ -0,0 +1,226 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent import futures
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Collection, Iterable
+
+from superelixier.network.cancellation import check_cancelled
+
+__all__ = [
+    "ExtractPlan",
+    "TAR_SUFFIXES",
+    "ZIP_SUFFIXES",
+    "extract_archive",
+    "extract_tar_stream",
+    "extract_zip",
+    "move_tree",
+    "wrapper_depth",
+]
+
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tar.xz", ".tar.bz2", ".tgz", ".txz", ".tbz2")
+PARALLEL_MIN_MEMBERS: int = 64  #: Zip archives with fewer members are extracted by one thread
+EXTRACT_THREADS: int = min(os.cpu_count() or 1, 8)
+
+
+@dataclass
+class ExtractPlan:
+    strip: int = 0  #: Leading folders to remove from the member paths
+    exclude: Collection[str] = ()  #: Names of the members to leave out
+
+
+#: Gets the names of all members of an archive, directories ending with "/", and decides how to extract them
+Planner = Callable[[list[str]], ExtractPlan]
+
+
+def extract_archive(archive: str, destination: str, planner: Planner = None) -> bool:
+    """
+    Extract zip and tar archives in-process. Other formats are left to 7-Zip.
+
+    :param planner: Looks at the listing of the archive before anything is written
+    :return: False if the archive must be extracted with 7-Zip instead. Nothing has been written to destination then.
+    """
+    name = os.path.split(archive)[1].casefold()
+    if not (name.endswith(ZIP_SUFFIXES) and zipfile.is_zipfile(archive)) and not (
+        name.endswith(TAR_SUFFIXES) and tarfile.is_tarfile(archive)
+    ):
+        return False
+    # Extract next to destination, so that an archive that fails halfway leaves nothing behind for 7-Zip to mix with
+    os.makedirs(destination, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix=".extracting-", dir=os.path.dirname(os.path.abspath(destination)))
+    shutil.copymode(destination, scratch)
+    try:
+        if name.endswith(ZIP_SUFFIXES):
+            extract_zip(archive, scratch, planner=planner)
+        else:
+            with tarfile.open(archive, "r:*") as tar_archive:
+                members = tar_archive.getmembers()
+                if planner is not None:
+                    plan = planner([_tar_name(member) for member in members])
+                    members = [member for member in members if _tar_name(member) not in plan.exclude]
+                    members = [member for member in members if _strip_tar(member, plan.strip)]
+                _extract_tar(tar_archive, members, scratch)
+    except (zipfile.BadZipFile, tarfile.TarError, NotImplementedError, EOFError, OSError):
+        shutil.rmtree(scratch, ignore_errors=True)
+        return False  # E.g. compression methods that zipfile doesn't know. 7-Zip starts over.
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    if os.listdir(destination):
+        move_tree(scratch, destination)
+    else:  # Keeps the folder times
+        os.rmdir(destination)
+        os.rename(scratch, destination)
+    return True
+
+
+def extract_tar_stream(stream: BinaryIO, destination: str) -> None:
+    """
+    Extract a tar archive while it is being read, e.g. from an HTTP response. Compression is detected.
+    """
+    with tarfile.open(fileobj=stream, mode="r|*") as tar_archive:
+        _extract_tar(tar_archive, tar_archive, destination)
+
+
+def move_tree(source: str, destination: str) -> None:
+    """
+    Move the contents of source into destination, replacing existing files like "7z x -aoa" does.
+    """
+    for root, dirs, files in os.walk(source):
+        target_root = os.path.join(destination, os.path.relpath(root, source))
+        os.makedirs(target_root, exist_ok=True)
+        for file in files:
+            os.replace(os.path.join(root, file), os.path.join(target_root, file))
+    shutil.rmtree(source)
+
+
+def wrapper_depth(names: list[str]) -> int:
+    """
+    Count the folders that wrap everything else in an archive, e.g. 1 for "app-1.0/bin/app.exe" and
+    "app-1.0/README". These are the folders that would be unwrapped after extraction.
+
+    :param names: Member names, directories ending with "/"
+    """
+    paths = [name.rstrip("/").split("/") for name in names if name.rstrip("/")]
+    dirs = {tuple(path[:i]) for path in paths for i in range(1, len(path))}
+    dirs |= {tuple(name.rstrip("/").split("/")) for name in names if name.endswith("/")}
+    depth = 0
+    while True:
+        top = {tuple(path[: depth + 1]) for path in paths if len(path) > depth}
+        if len(top) != 1 or next(iter(top)) not in dirs:
+            return depth
+        depth += 1
+
+
+def extract_zip(archive: str, destination: str, *, threads: int = EXTRACT_THREADS, planner: Planner = None) -> None:
+    """
+    Extract a zip archive. Members are streamed from the archive into their files, with modification times kept like
+    7-Zip does. Large archives are extracted by several threads, each with its own handle on the archive file, so that
+    decompression and writing happen in parallel. Memory use stays at one copy buffer per thread.
+    """
+    with zipfile.ZipFile(archive) as zip_archive:
+        members = zip_archive.infolist()
+        if planner is not None:
+            plan = planner([member.filename for member in members])
+            members = [member for member in members if member.filename not in plan.exclude]
+            members = [member for member in members if _strip_zip(member, plan.strip)]
+        directories = [member for member in members if member.is_dir()]
+        files = [member for member in members if not member.is_dir()]
+        # Directories before the files, so that threads don't race to create them
+        created = [(zip_archive.extract(member, destination), _mtime(member)) for member in directories]
+        if threads < 2 or len(files) < PARALLEL_MIN_MEMBERS:
+            for member in files:
+                _extract_member(zip_archive, member, destination)
+        else:
+            local = threading.local()
+            handles: list[zipfile.ZipFile] = []
+
+            def extract(member: zipfile.ZipInfo) -> None:
+                if not hasattr(local, "archive"):
+                    local.archive = zipfile.ZipFile(archive)
+                    handles.append(local.archive)
+                _extract_member(local.archive, member, destination)
+
+            try:
+                with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+                    # Largest first, so that one big member doesn't end up last
+                    files.sort(key=lambda member: member.file_size, reverse=True)
+                    for job in futures.as_completed([executor.submit(extract, member) for member in files]):
+                        job.result()
+            finally:
+                for handle in handles:
+                    handle.close()
+        for path, mtime in reversed(created):  # After their contents, which change the directories' times
+            os.utime(path, (mtime, mtime))
+
+
+def _extract_member(archive: zipfile.ZipFile, member: zipfile.ZipInfo, destination: str) -> None:
+    check_cancelled()
+    try:
+        path = archive.extract(member, destination)  # Sanitizes absolute paths and ".."
+    except FileExistsError:  # Another thread created a parent directory meanwhile
+        path = archive.extract(member, destination)
+    mtime = _mtime(member)
+    os.utime(path, (mtime, mtime))
+
+
+def _mtime(member: zipfile.ZipInfo) -> float:
+    return time.mktime(member.date_time + (0, 0, -1))
+
+
+def _strip_zip(member: zipfile.ZipInfo, strip: int) -> bool:
+    """
+    Remove leading folders from the path the member is extracted to.
+
+    :return: False if nothing is left of the path
+    """
+    if strip:
+        parts = member.filename.rstrip("/").split("/")[strip:]
+        if not parts:
+            return False
+        member.filename = "/".join(parts) + ("/" if member.is_dir() else "")  # Reading uses member.orig_filename
+    return True
+
+
+def _strip_tar(member: tarfile.TarInfo, strip: int) -> bool:
+    """
+    Remove leading folders from the path the member is extracted to.
+
+    :return: False if nothing is left of the path
+    """
+    if strip:
+        parts = member.name.split("/")[strip:]
+        if not parts:
+            return False
+        member.name = "/".join(parts)
+        if member.islnk():  # Hard links name their target by its path in the archive
+            member.linkname = "/".join(member.linkname.split("/")[strip:])
+    return True
+
+
+def _tar_name(member: tarfile.TarInfo) -> str:
+    """
+    Name of the member, ending with "/" for directories like in zip archives.
+    """
+    return member.name + "/" if member.isdir() else member.name
+
+
+def _extract_tar(archive: tarfile.TarFile, members: Iterable[tarfile.TarInfo], destination: str) -> None:
+    if not hasattr(tarfile, "data_filter"):  # Python < 3.11.4
+        raise tarfile.TarError("Extraction filters are not available")
+    # The "data" filter refuses links and paths that lead outside destination, as well as device files
+    for member in members:
+        check_cancelled()
+        archive.extract(member, destination, filter="data")
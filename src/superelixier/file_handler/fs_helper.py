@@ -7,9 +7,12 @@ You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import os
 import re
+import threading
+from typing import Iterable
 
+from superelixier.file_handler.manifest import FileRecord, file_digest
 from superelixier.generic.generic_app import GenericApp
-from superelixier.helper.filesystem import simple_folder_list
+from superelixier.helper.filesystem import scan_files
 from superelixier.helper.terminal import Ansi
 
 
@@ -25,10 +28,7 @@ def list_appdatas(app: GenericApp):
             if os.path.isfile(data):
                 keep_list.append(data)
             if os.path.isdir(data):
-                for root, _, files in os.walk(data):
-                    for file in files:
-                        my_file = os.path.join(root, file)
-                        keep_list.append(my_file)
+                keep_list.extend(os.path.join(data, file) for file in scan_files(data))
         else:
             missing_appdata.append(appdata)
     if len(missing_appdata) != 0:
@@ -36,44 +36,120 @@ def list_appdatas(app: GenericApp):
     return keep_list
 
 
-def lock_folder(app, staging, staging_list):
+def unchanged_files(
+    app: GenericApp, staging: str, staged: dict[str, os.stat_result], installed: dict[str, FileRecord]
+) -> dict[str, FileRecord]:
+    """
+    Find the staged files that are identical to the installed ones, so that they can stay in place.
+    Files of different size differ. Files of the same size are compared by BLAKE2 hash: modification times come from
+    the archives, and builds with fixed timestamps would otherwise never be updated. A hash recorded in the manifest
+    saves reading the installed file, as long as the file's size and modification time still match the record.
+
+    :param staged: Stat data of the staged files, by path relative to staging
+    :param installed: Records of the installed files, by path relative to the app folder
+    :return: Records of the unchanged installed files
+    """
+    unchanged = {}
+    for my_file in staged.keys() & installed.keys():
+        new, old = staged[my_file], installed[my_file]
+        installed_file = os.path.join(app.appdir, my_file)
+        if old.digest is not None:
+            try:
+                stat = os.stat(installed_file)
+            except OSError:
+                continue
+            if not old.matches(stat):  # Changed since it was recorded, so the hash is stale
+                old = FileRecord.of(stat)
+        if new.st_size != old.size:
+            continue
+        if old.digest is None:
+            old.digest = file_digest(installed_file)
+        if file_digest(os.path.join(staging, my_file)) != old.digest:
+            continue
+        unchanged[my_file] = old
+    return unchanged
+
+
+class HandleBudget:
+    """
+    Counts the files that are held open to lock app folders, so that merges running at the same time together stay
+    below the limit of open files per process.
+    """
+
+    def __init__(self, size: int):
+        self.__size = size
+        self.__free = size
+        self.__condition = threading.Condition()
+
+    def acquire(self, count: int) -> int:
+        """
+        Wait until count handles are free and take them. Larger requests than the whole budget wait for all of it.
+
+        :return: The number of handles taken. Give them back with release.
+        """
+        count = min(count, self.__size)
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__free >= count)
+            self.__free -= count
+        return count
+
+    def release(self, count: int) -> None:
+        with self.__condition:
+            self.__free += count
+            self.__condition.notify_all()
+
+
+# There is a limit of 2048 opened files per process.
+MAX_LOCKED_FILES: int = 2000  #: Files that lock_folder holds open at the same time, in all threads together
+locked_files = HandleBudget(MAX_LOCKED_FILES)
+
+
+def lock_folder(app, replaced_files: Iterable[str]):
     """
     Open all files in binary append mode to get exclusive access. Close all files if any file is in use.
+    Folders with too many files to open them all only get their executables locked.
     # TODO Make this a contextmanager
-    :param staging_list:
-    :param staging:
+    :param replaced_files: Installed files that are about to be replaced, relative to the app folder. Files that
+        turn out to be missing are left out.
     :param app:
-    :return: Dictionary with the file handles. Invoker must close these again.
+    :return: Dictionary with the file handles. Invoker must release these again with unlock_folder.
     """
     opened_files = {}
-    target_list = []
-    for my_file in staging_list:
-        target_list.append(my_file.replace(staging, app.appdir))
     # Here we could also check if any binaries are running and not even bother with trying to lock all files.
-    file_list = simple_folder_list(app.appdir)
-    for my_file in file_list:
-        if my_file not in target_list:
-            file_list.remove(my_file)
+    file_list = [os.path.join(app.appdir, my_file) for my_file in sorted(replaced_files)]
+    if len(file_list) > MAX_LOCKED_FILES:
+        file_list = [
+            existing_file
+            for existing_file in file_list
+            if re.search(
+                "\\.(bat|cmd|com|dll|exe|elf|js|jse|msc|ps1|sh|vbe|vbs|wsf|wsh)$",
+                os.path.split(existing_file)[-1].casefold(),
+            )
+        ]
+    file_list = [existing_file for existing_file in file_list if os.path.isfile(existing_file)]
+    reserved = locked_files.acquire(len(file_list))
     try:
         for existing_file in file_list:
-            # There is a limit of 2048 opened files per process.
-            if len(file_list) <= 2000:
-                if os.path.isfile(existing_file):
-                    opened_files[existing_file] = open(existing_file, "ab")
-            else:
-                if os.path.isfile(existing_file) and re.search(
-                    "\\.(bat|cmd|com|dll|exe|elf|js|jse|msc|ps1|sh|vbe|vbs|wsf|wsh)$",
-                    os.path.split(existing_file)[-1].casefold(),
-                ):
-                    opened_files[existing_file] = open(existing_file, "ab")
+            opened_files[existing_file] = open(existing_file, "ab")
     except PermissionError:
         print(f"{Ansi.MAGENTA}{app.name}: Folder is in use. Update files will be moved next time.")
         for key in opened_files:
             opened_files[key].close()
+        locked_files.release(reserved)
         return None
     except OSError:
         print(f"{Ansi.MAGENTA}{app.name}: Couldn't get folder lock.")
         for key in opened_files:
             opened_files[key].close()
+        locked_files.release(reserved)
         return None
     return opened_files
+
+
+def unlock_folder(opened_files: dict) -> None:
+    """
+    Close the file handles from lock_folder, including those closed already, and give them back to the budget.
+    """
+    for key in opened_files:
+        opened_files[key].close()
+    locked_files.release(min(len(opened_files), MAX_LOCKED_FILES))
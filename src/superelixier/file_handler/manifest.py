@@ -0,0 +1,83 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+
+from superelixier.helper.filesystem import atomic_write
+
+__all__ = ["FileRecord", "MANIFEST_FILE", "MANIFEST_SPEC", "Manifest", "file_digest"]
+
+MANIFEST_FILE: str = "superelixier-manifest.json"
+MANIFEST_SPEC: int = 2  #: First spec of superelixier.json whose apps come with a manifest
+
+
+@dataclass
+class FileRecord:
+    size: int
+    mtime_ns: int
+    digest: str | None = None  #: BLAKE2 of the contents, None if not computed yet
+
+    @classmethod
+    def of(cls, stat: os.stat_result) -> "FileRecord":
+        return cls(stat.st_size, stat.st_mtime_ns)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """
+        :return: True if the file hasn't been touched since it was recorded
+        """
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+@dataclass
+class Manifest:
+    """
+    Every file that the updater has put into an app folder, stored next to superelixier.json. Updates use it instead
+    of walking the app folder to find out which files are there and whether they change. Files that are modified after
+    the update (e.g. by the app itself) no longer match their records, which callers check with FileRecord.matches.
+    """
+
+    files: dict[str, FileRecord] = field(default_factory=dict)  #: By native path relative to the app folder
+
+    @classmethod
+    def load(cls, appdir: str) -> "Manifest | None":
+        """
+        :return: None if the app folder has no manifest, or one that can't be read
+        """
+        try:
+            with open(os.path.join(appdir, MANIFEST_FILE), "r", encoding="utf-8") as fd:
+                loaded = json.load(fd)
+            return cls(
+                {
+                    os.path.join(*path.split("/")): FileRecord(size, mtime_ns, digest)
+                    for path, (size, mtime_ns, digest) in loaded["files"].items()
+                }
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, appdir: str) -> None:
+        """
+        Write the manifest into appdir. Missing digests are computed from the files in appdir first.
+        """
+        for path, record in self.files.items():
+            if record.digest is None:
+                record.digest = file_digest(os.path.join(appdir, path))
+        files = {
+            "/".join(path.split(os.sep)): [record.size, record.mtime_ns, record.digest]
+            for path, record in sorted(self.files.items())
+        }
+        with atomic_write(os.path.join(appdir, MANIFEST_FILE)) as tmp:
+            with open(tmp, "w", encoding="utf-8") as fd:
+                json.dump({"files": files}, fd, separators=(",", ":"))
+
+
+def file_digest(file: str) -> str:
+    with open(file, "rb") as fd:
+        return hashlib.file_digest(fd, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
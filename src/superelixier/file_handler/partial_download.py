@@ -0,0 +1,169 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from superelixier.helper.filesystem import atomic_write
+
+__all__ = ["PartialDownload"]
+
+SAVE_INTERVAL: int = 4 * 1024**2  #: Bytes downloaded between updates of the progress file
+
+
+@dataclass
+class PartialDownload:
+    """
+    A download that may be interrupted and resumed later, even by another run of the program.
+    The data is written to a preallocated file in a cache folder, next to a JSON file with the download's progress.
+    The folder should be on the volume of the download's target, so that the finished file is moved, not copied.
+    """
+
+    url: str  #: URL the download was started from, before redirects
+    directory: str  #: Folder with the partial downloads
+    validator: str  #: ETag or Last-Modified of the file. Data of different versions of a file must not be mixed.
+    size: int
+    ranges: list[list[int]]  #: [first byte, last byte, next byte to download] of each part
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    _unsaved: int = field(default=0, repr=False, compare=False)
+    __claimed = set()  #: Paths of the lock files held by this process
+    __claimed_lock = threading.Lock()
+
+    @classmethod
+    @contextmanager
+    def claimed(cls, url: str, directory: str) -> Iterator[bool]:
+        """
+        Lock the partial download of the URL against other downloads of it, in this and in other processes.
+
+        :return: Context manager that yields False if another download holds the lock
+        """
+        os.makedirs(directory, exist_ok=True)
+        lock_file = PartialDownload.__file(url, directory, ".lock")
+        with PartialDownload.__claimed_lock:
+            taken = lock_file in PartialDownload.__claimed  # POSIX record locks don't tell threads apart
+            PartialDownload.__claimed.add(lock_file)
+        if taken:
+            yield False
+            return
+        handle = None
+        try:
+            try:
+                if sys.platform == "win32":  # Other processes can't remove the file while it is open
+                    if os.path.exists(lock_file):
+                        os.remove(lock_file)
+                    handle = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_RDWR)
+                else:  # POSIX
+                    import fcntl
+
+                    handle = os.open(lock_file, os.O_CREAT | os.O_RDWR)
+                    fcntl.lockf(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if handle is not None:
+                    os.close(handle)
+                    handle = None
+            yield handle is not None
+        finally:
+            if handle is not None:
+                os.close(handle)
+                if os.path.isfile(lock_file):
+                    os.remove(lock_file)
+            with PartialDownload.__claimed_lock:
+                PartialDownload.__claimed.discard(lock_file)
+
+    @classmethod
+    def load(cls, url: str, directory: str) -> "PartialDownload | None":
+        try:
+            with open(PartialDownload.__file(url, directory, ".json"), "r", encoding="utf-8") as fd:
+                state = json.load(fd)
+            partial = PartialDownload(state["url"], directory, state["validator"], state["size"], state["ranges"])
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        if partial.url != url or not os.path.isfile(partial.path) or os.path.getsize(partial.path) != partial.size:
+            return None
+        return partial
+
+    @classmethod
+    def create(cls, url: str, directory: str, validator: str, size: int, parts: int) -> "PartialDownload":
+        """
+        Start a new download, replacing any earlier one of the URL.
+
+        :param parts: Number of ranges to split the file into
+        """
+        PartialDownload.discard(url, directory)
+        step = -(-size // parts) or 1
+        ranges = [[start, min(start + step, size) - 1, start] for start in range(0, size, step)]
+        partial = PartialDownload(url, directory, validator, size, ranges)
+        os.makedirs(directory, exist_ok=True)
+        with open(partial.path, "wb") as fd:
+            fd.truncate(size)
+        partial.save()
+        return partial
+
+    @classmethod
+    def discard(cls, url: str, directory: str) -> None:
+        for path in (PartialDownload.__file(url, directory, ".part"), PartialDownload.__file(url, directory, ".json")):
+            if os.path.isfile(path):
+                os.remove(path)
+
+    @property
+    def path(self) -> str:
+        return PartialDownload.__file(self.url, self.directory, ".part")
+
+    @property
+    def complete(self) -> bool:
+        return all(next_byte > last for _, last, next_byte in self.ranges)
+
+    @property
+    def downloaded(self) -> int:
+        return sum(next_byte - first for first, _, next_byte in self.ranges)
+
+    def advance(self, index: int, length: int) -> None:
+        """
+        Record that the next length bytes of a range have been written. Thread-safe.
+        """
+        with self._lock:
+            self.ranges[index][2] += length
+            self._unsaved += length
+            if self._unsaved >= SAVE_INTERVAL:
+                self.__save()
+
+    def save(self) -> None:
+        with self._lock:
+            self.__save()
+
+    def finish(self, target: str) -> None:
+        """
+        Move the completed file to target and forget the download.
+        """
+        if os.path.isfile(target):
+            os.remove(target)
+        shutil.move(self.path, target)
+        PartialDownload.discard(self.url, self.directory)
+
+    def __save(self) -> None:
+        if not os.path.isfile(self.path):  # Discarded
+            return
+        path = PartialDownload.__file(self.url, self.directory, ".json")
+        state = {"url": self.url, "validator": self.validator, "size": self.size, "ranges": self.ranges}
+        try:
+            with atomic_write(path) as tmp:
+                with open(tmp, "w", encoding="utf-8") as fd:
+                    json.dump(state, fd)
+            self._unsaved = 0
+        except OSError:
+            pass
+
+    @classmethod
+    def __file(cls, url: str, directory: str, suffix: str) -> str:
+        return os.path.join(directory, hashlib.sha256(url.encode()).hexdigest() + suffix)
@@ -0,0 +1,158 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import io
+import queue
+import threading
+import time
+from typing import Callable
+
+from superelixier.file_handler import FileHandler
+from superelixier.generic.generic_app import GenericApp
+from superelixier.helper.terminal import Ansi, GroupedOutput, grouped_output, output_into
+from superelixier.network.cancellation import cancel_all, is_cancelled
+
+__all__ = ["UpgradePipeline"]
+
+DOWNLOAD_WORKERS: int = 4  #: Apps downloading at the same time
+EXTRACT_WORKERS: int = 2  #: Apps being extracted at the same time, i.e. 7-Zip/innoextract processes
+APPLY_WORKERS: int = 2  #: Apps being moved into their folders at the same time
+QUEUE_SIZE: int = 16  #: Apps waiting for extraction. When the queue is full, downloading waits.
+STOP_TIMEOUT: float = 5  #: Seconds that workers are given to stop after cancellation, before their files are removed
+_DONE = None  #: Queue item that stops a worker
+
+
+class UpgradePipeline:
+    """
+    Updates and installs apps in three stages that run at the same time: download (network), extract (CPU) and
+    apply (disk). Apps can be submitted while the checks for other apps are still running. Each stage has its own
+    workers, so one app is extracted while others are downloading.
+
+    The output of each app is collected and printed as one block when the app is done.
+    Use as a context manager: leaving the context waits until every submitted app is done. If the context is left
+    with an exception (e.g. Ctrl+C), the apps in progress are cancelled and their downloads and staging folders removed.
+    """
+
+    def __init__(
+        self,
+        on_start: Callable[[GenericApp], None] = None,
+        *,
+        download_workers: int = DOWNLOAD_WORKERS,
+        extract_workers: int = EXTRACT_WORKERS,
+        apply_workers: int = APPLY_WORKERS,
+    ):
+        """
+        :param on_start: Called with each app when its download starts. Its output is part of the app's block.
+        """
+        self.__on_start = on_start
+        self.__output: GroupedOutput | None = None
+        self.__context = None
+        self.__buffers: dict[FileHandler, io.StringIO] = {}
+        self.__unfinished: set[FileHandler] = set()
+        self.__lock = threading.Lock()
+        # Unbounded, because apps are submitted from the check engine, which must not wait for the downloads
+        downloads: queue.Queue[FileHandler | None] = queue.Queue()
+        extracts: queue.Queue[FileHandler | None] = queue.Queue(maxsize=QUEUE_SIZE)
+        applies: queue.Queue[FileHandler | None] = queue.Queue()
+        self.__stages = [
+            (downloads, self.__download, extracts, download_workers),
+            (extracts, FileHandler.project_extract, applies, extract_workers),
+            (applies, FileHandler.project_apply, None, apply_workers),
+        ]
+        self.__workers: list[list[threading.Thread]] = []
+
+    def __enter__(self) -> "UpgradePipeline":
+        self.__context = grouped_output()
+        self.__output = self.__context.__enter__()
+        for inbox, step, outbox, count in self.__stages:
+            workers = [
+                threading.Thread(target=self.__work, args=(inbox, step, outbox), daemon=True) for _ in range(count)
+            ]
+            for worker in workers:
+                worker.start()
+            self.__workers.append(workers)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            if exc_type is None:
+                self.join()
+            else:
+                self.__discard()
+        except BaseException:  # E.g. Ctrl+C while waiting for the apps
+            self.__discard()
+            raise
+        finally:
+            with self.__lock:
+                unfinished = [*self.__buffers]
+            for handler in unfinished:
+                self.__release(handler)  # Show what unfinished apps have printed so far
+            self.__context.__exit__(exc_type, exc_val, exc_tb)
+
+    def submit(self, app: GenericApp) -> None:
+        """
+        Queue the app for download. Never blocks, so it is safe to call from an event loop.
+        """
+        handler = FileHandler(app)
+        with self.__lock:
+            self.__buffers[handler] = io.StringIO()
+            self.__unfinished.add(handler)
+        self.__stages[0][0].put(handler)
+
+    def join(self) -> None:
+        """
+        Wait until every submitted app is done, then stop the workers.
+        """
+        for (inbox, *_), workers in zip(self.__stages, self.__workers):
+            for _ in workers:
+                inbox.put(_DONE)
+            for worker in workers:
+                worker.join()
+
+    def __discard(self) -> None:
+        cancel_all()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for worker in [worker for workers in self.__workers for worker in workers]:
+            worker.join(timeout=max(deadline - time.monotonic(), 0))
+        with self.__lock:
+            unfinished = [*self.__unfinished]
+        for handler in unfinished:
+            handler.discard()
+
+    def __download(self, handler: FileHandler) -> None:
+        if self.__on_start is not None:
+            self.__on_start(handler.app)
+        handler.project_download()
+
+    def __work(self, inbox: queue.Queue, step: Callable[[FileHandler], None], outbox: queue.Queue | None) -> None:
+        while (handler := inbox.get()) is not _DONE:
+            if is_cancelled():
+                continue
+            with self.__lock:
+                buffer = self.__buffers.get(handler, io.StringIO())
+            try:
+                with output_into(buffer):
+                    step(handler)
+            except Exception as e:  # noqa: A failing app must not stop the others
+                print(f"{Ansi.ERROR}{handler.app.name}: {e}{Ansi.RESET}", file=buffer)
+                self.__finish(handler)
+                continue
+            if outbox is None:
+                self.__finish(handler)
+            else:
+                outbox.put(handler)
+
+    def __finish(self, handler: FileHandler) -> None:
+        with self.__lock:
+            self.__unfinished.discard(handler)
+        self.__release(handler)
+
+    def __release(self, handler: FileHandler) -> None:
+        with self.__lock:
+            buffer = self.__buffers.pop(handler, None)
+        if buffer is not None:
+            self.__output.release(buffer)
@@ -0,0 +1,152 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import asyncio
+from collections import defaultdict
+from concurrent import futures
+from typing import Callable, Iterable
+
+from requests import RequestException
+from urllib3.exceptions import HTTPError
+
+from superelixier.generic.generic_app import GenericApp
+from superelixier.generic.generic_manager import GenericManager
+from superelixier.github.github_app import GithubApp
+from superelixier.github.github_manager import GithubManager
+from superelixier.helper.terminal import Ansi
+from superelixier.helper.types import CheckMode
+from superelixier.network import MAX_PER_HOST
+from superelixier.network.cancellation import CancelledException, Deadline, cancel_all, deadline
+from superelixier.network.scheduler import prioritized
+from superelixier.network.single_flight import single_flight
+
+MAX_IN_FLIGHT: int = 256  #: Checks that may wait on the network at the same time (async mode)
+THREADED_WORKERS: int = 8  #: Worker count of the thread pool fallback
+APP_BUDGET: float = 90  #: Seconds that the check of one app may take
+CHECK_DEADLINE: float = 300  #: Seconds that all checks together may take
+GRACE: float = 5  #: Seconds that a check is given to notice its deadline before the async engine moves on
+
+
+class CheckEngine:
+    """
+    Runs the remote checks for a list of apps and reports each app as soon as its check has finished.
+    Checks that miss their deadline are reported as "timed_out", everything else proceeds.
+    """
+
+    def __init__(
+        self,
+        apps: Iterable[GenericApp],
+        mode: CheckMode = "async",
+        *,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_per_host: int = MAX_PER_HOST,
+        app_budget: float = APP_BUDGET,
+        check_deadline: float = CHECK_DEADLINE,
+    ):
+        self.__apps = list(apps)
+        self.__mode = mode
+        self.__max_in_flight = max_in_flight
+        self.__max_per_host = max_per_host
+        self.__app_budget = app_budget
+        self.__check_deadline = check_deadline
+        self.__deadline = Deadline(None)
+
+    def run(self, on_result: Callable[[GenericApp], None] = None) -> None:
+        """
+        Check all apps. Blocks until every check is done or has timed out.
+
+        :param on_result: Called from the calling thread with each app, in the order the checks finish
+        """
+        if on_result is None:
+            on_result = CheckEngine.__ignore
+        self.__deadline = Deadline(self.__check_deadline)
+        try:
+            with deadline(self.__deadline):
+                GithubManager.resolve_batch([app for app in self.__apps if isinstance(app, GithubApp)])
+            match self.__mode:
+                case "async":
+                    asyncio.run(self.__run_async(on_result))
+                case "threaded":
+                    with futures.ThreadPoolExecutor(max_workers=THREADED_WORKERS) as executor:
+                        projects = {executor.submit(self.check, app): app for app in self.__apps}
+                        for done in futures.as_completed(projects):
+                            on_result(projects[done])
+                case _:  # "serial"
+                    for app in self.__apps:
+                        self.check(app)
+                        on_result(app)
+        except KeyboardInterrupt:
+            cancel_all()
+            raise
+        finally:
+            single_flight.clear()
+
+    async def __run_async(self, on_result: Callable[[GenericApp], None]) -> None:
+        loop = asyncio.get_running_loop()
+        # The app types do blocking I/O, so the size of the default executor is what bounds the requests in flight
+        loop.set_default_executor(futures.ThreadPoolExecutor(max_workers=self.__max_in_flight))
+        host_limits = defaultdict(lambda: asyncio.Semaphore(self.__max_per_host))
+
+        async def check(app: GenericApp) -> GenericApp:
+            async with host_limits[app.host]:
+                limit = self.__app_deadline()
+                try:
+                    await asyncio.wait_for(self.__check_async(app, limit), timeout=limit.remaining() + GRACE)
+                except asyncio.TimeoutError:
+                    app.update_status = "timed_out"
+            return app
+
+        try:
+            for done in asyncio.as_completed([check(app) for app in self.__apps]):
+                on_result(await done)
+        except asyncio.CancelledError:  # Ctrl+C
+            cancel_all()
+            raise
+
+    def check(self, app: GenericApp) -> None:
+        limit = self.__app_deadline()
+        try:
+            with prioritized(app.check_priority), deadline(limit):
+                app.execute_shared()
+            GenericManager.check_update(app)
+        except CancelledException:
+            app.update_status = "timed_out"
+        except (RequestException, HTTPError):
+            app.update_status = "failed"
+        except Exception as e:  # noqa: One broken definition must not stop the other checks
+            print(f"{Ansi.ERROR}{app.name}: {type(e).__name__}: {e}{Ansi.RESET}")
+            app.update_status = "unknown"
+        CheckEngine.__check_timed_out(app, limit)
+
+    async def __check_async(self, app: GenericApp, limit: Deadline) -> None:
+        try:
+            with prioritized(app.check_priority), deadline(limit):
+                await app.execute_async()
+            await asyncio.to_thread(GenericManager.check_update, app)
+        except CancelledException:
+            app.update_status = "timed_out"
+        except (RequestException, HTTPError):
+            app.update_status = "failed"
+        except Exception as e:  # noqa: One broken definition must not stop the other checks
+            print(f"{Ansi.ERROR}{app.name}: {type(e).__name__}: {e}{Ansi.RESET}")
+            app.update_status = "unknown"
+        CheckEngine.__check_timed_out(app, limit)
+
+    def __app_deadline(self) -> Deadline:
+        return Deadline(min(self.__app_budget, self.__deadline.remaining()))
+
+    @classmethod
+    def __check_timed_out(cls, app: GenericApp, limit: Deadline) -> None:
+        """
+        The app types report failed requests as "failed". If the deadline has passed, that is the likely reason.
+        """
+        if limit.expired and app.update_status in {"failed", "unknown"}:
+            app.update_status = "timed_out"
+
+    @classmethod
+    def __ignore(cls, _: GenericApp) -> None:
+        pass
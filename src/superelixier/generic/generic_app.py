@@ -5,6 +5,7 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
+import asyncio
 import json
 import os
 import random
@@ -14,8 +15,9 @@ from typing import Callable
 
 from superelixier.definition import Definition
 from superelixier.helper.types import UpdateStatus
+from superelixier.network.single_flight import single_flight
 
-UPDATER_JSON_SPEC: int = 1
+UPDATER_JSON_SPEC: int = 2  #: 2: The app folder has a manifest of the installed files
 
 
 @dataclass
@@ -67,6 +69,24 @@ class GenericApp:
                 except (ValueError, TypeError):
                     os.unlink(installed_json)
 
+    def execute_shared(self):
+        """
+        Variant of execute() for apps that are listed in several directories: The remote check is only done once per
+        definition, and all app objects of the definition get its result.
+        """
+        self._version_latest, self.update_status = single_flight.do(self.check_key, self.__execute_for_result)
+
+    async def execute_async(self):
+        """
+        Awaitable variant of execute_shared(). The network code of the app types is blocking, so it runs in the event
+        loop's default executor.
+        """
+        await asyncio.to_thread(self.execute_shared)
+
+    def __execute_for_result(self) -> tuple[VersionInfo | None, UpdateStatus]:
+        self.execute()
+        return self._version_latest, self.update_status
+
     @property
     def name(self):
         return self.definition.info.name
@@ -75,6 +95,28 @@ class GenericApp:
     def versioning(self):
         raise NotImplementedError
 
+    @property
+    def host(self) -> str:
+        """
+        Network location that the remote check talks to.
+        """
+        raise NotImplementedError
+
+    @property
+    def check_key(self) -> tuple:
+        """
+        Apps with equal keys have the same remote check.
+        """
+        return type(self).__name__, self.name
+
+    @property
+    def check_priority(self) -> int:
+        """
+        Scheduling priority of the remote check, lower is more important. Checking installed apps is what the rate
+        limit budgets should be spent on first; apps without version info get updated either way.
+        """
+        return 0 if self.version_installed is not None else 1
+
     @property
     def appdir(self):
         return self._appdir
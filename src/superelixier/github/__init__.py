@@ -7,3 +7,4 @@ You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 GITHUB_DATE = "%Y-%m-%dT%H:%M:%SZ"
 GITHUB_API = "https://api.github.com"
+GITHUB_GRAPHQL = f"{GITHUB_API}/graphql"
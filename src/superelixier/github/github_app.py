@@ -6,16 +6,24 @@ If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import json
+from urllib.parse import urlparse
 
-import requests as rest
-from requests import RequestException
+from requests import RequestException, Response
 from urllib3.exceptions import HTTPError
 
 from superelixier import configuration
 from superelixier.definition import Definition
 from superelixier.generic.generic_app import GenericApp
 from superelixier.github import GITHUB_API
+from superelixier.helper.json_stream import iter_array
 from superelixier.helper.terminal import Ansi
+from superelixier.helper.types import JsonArray, JsonObject
+from superelixier.network.cancellation import check_cancelled
+from superelixier.network.response_cache import ResponseCache
+
+CHUNK_SIZE: int = 16384
+RELEASES_PER_PAGE: int = 10
+RESPONSE_CACHE = ResponseCache("github")
 
 
 class GithubApp(GenericApp):
@@ -27,6 +35,8 @@ class GithubApp(GenericApp):
         """
         Do (network) latency sensitive parts of object creation here.
         """
+        if self._version_latest is not None:  # Already resolved by GithubManager.resolve_batch
+            return
         self._api_call = self.__api_request()
         if self._api_call is None:
             self.update_status = "failed"
@@ -37,22 +47,77 @@ class GithubApp(GenericApp):
             return
 
     def __api_request(self):
+        """
+        Only fetch what is needed: If pre-releases are not wanted, the API can tell the latest release directly.
+        Otherwise, read a short page of releases, and stop reading once a usable release has arrived.
+        """
         try:
-            releases = rest.get(f"{GITHUB_API}/repos/{self.user}/{self.project}/releases", headers=self.headers)
-            api_response = json.loads(releases.text)
-            if releases.status_code != 200:
-                print(Ansi.ERROR + self.name + ": HTTP Status %s: %s" % (releases.status_code, api_response["message"]))
+            if self.prerelease:
+                url = f"{GITHUB_API}/repos/{self.user}/{self.project}/releases?per_page={RELEASES_PER_PAGE}"
+                parse = self.__parse_release_list
+            else:
+                url = f"{GITHUB_API}/repos/{self.user}/{self.project}/releases/latest"
+                parse = self.__parse_release_latest
+            releases, api_response = RESPONSE_CACHE.get(url, headers=self.headers, parse=parse, stream=True)
+            if api_response is None:
+                message = json.loads(releases.text)["message"]
+                print(Ansi.ERROR + self.name + ": HTTP Status %s: %s" % (releases.status_code, message))
                 return None
         except (RequestException, HTTPError):
             return None
+        except ValueError:
+            print(f"{Ansi.ERROR}{self.name}: Bad response from the GitHub API")
+            return None
         return api_response
 
+    def __parse_release_list(self, response: Response) -> JsonArray:
+        from superelixier.github.github_manager import GithubManager
+
+        releases = []
+        try:
+            for release in iter_array(response.iter_content(chunk_size=CHUNK_SIZE)):
+                check_cancelled()
+                if release.get("draft"):
+                    continue
+                releases.append(GithubApp.__minimal_release(release))
+                if GithubManager.select_release(self, releases[-1:]) is not None:
+                    break
+        finally:
+            response.close()
+        return releases
+
+    @classmethod
+    def __parse_release_latest(cls, response: Response) -> JsonArray:
+        return [GithubApp.__minimal_release(json.loads(response.content))]
+
+    @classmethod
+    def __minimal_release(cls, release: JsonObject) -> JsonObject:
+        """
+        Keep only the keys that GithubManager.build_blob_list looks at.
+        """
+        return {
+            "prerelease": release["prerelease"],
+            "published_at": release["published_at"],
+            "assets": [{"browser_download_url": i["browser_download_url"]} for i in release["assets"]],
+        }
+
     def __get_latest_version(self):
         from superelixier.github.github_manager import GithubManager
 
         my_list = GithubManager.build_blob_list(self)
         return my_list
 
+    def use_releases(self, releases: JsonArray) -> bool:
+        """
+        Resolve the latest version from release data that was fetched elsewhere. The release objects need the keys
+        of the REST API that GithubManager.build_blob_list looks at.
+
+        :return: True if a matching release was found
+        """
+        self._api_call = releases
+        self._version_latest = self.__get_latest_version()
+        return self._version_latest is not None
+
     @property
     def api_call(self):
         return self._api_call
@@ -77,6 +142,10 @@ class GithubApp(GenericApp):
     def versioning(self):
         return "github"
 
+    @property
+    def host(self):
+        return urlparse(GITHUB_API).netloc
+
     @property
     def headers(self):
         return {
@@ -7,9 +7,27 @@ You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import re
 
+from requests import RequestException
+from urllib3.exceptions import HTTPError
+
+from superelixier import configuration
 from superelixier.generic.generic_app import VersionInfo
 from superelixier.generic.generic_manager import GenericManager
+from superelixier.github import GITHUB_GRAPHQL
 from superelixier.github.github_app import GithubApp
+from superelixier.helper.terminal import Ansi
+from superelixier.helper.types import JsonArray, JsonObject
+from superelixier.network.session import http_session
+
+GRAPHQL_CHUNK: int = 50  #: Repositories per GraphQL query
+GRAPHQL_RELEASES: int = 10  #: Newest releases to look at per repository
+GRAPHQL_ASSETS: int = 100  #: Assets per release
+GRAPHQL_REPO = """\
+  r{i}: repository(owner: $o{i}, name: $n{i}) {{
+    releases(first: {releases}, orderBy: {{field: CREATED_AT, direction: DESC}}) {{
+      nodes {{ isDraft isPrerelease publishedAt releaseAssets(first: {assets}) {{ nodes {{ downloadUrl }} }} }}
+    }}
+  }}"""
 
 
 class GithubManager(GenericManager):
@@ -17,18 +35,87 @@ class GithubManager(GenericManager):
         super().__init__()
 
     @classmethod
-    def build_blob_list(cls, app: GithubApp) -> VersionInfo:
-        latest_release = None
-        for release in app.api_call:
-            if release["prerelease"] and app.prerelease:
-                latest_release = release
-                break
-            if not release["prerelease"]:
-                latest_release = release
-                break
+    def build_blob_list(cls, app: GithubApp) -> VersionInfo | None:
+        latest_release = cls.select_release(app, app.api_call)
+        if latest_release is None:
+            return None
         my_version = VersionInfo(version_id=latest_release["published_at"], blobs=[])
         for asset in latest_release["assets"]:
             filename = asset["browser_download_url"].split("/")[-1]
             if re.fullmatch(app.blob_re, filename) is not None:
                 my_version.blobs.append(asset["browser_download_url"])
         return my_version
+
+    @classmethod
+    def select_release(cls, app: GithubApp, releases: JsonArray) -> JsonObject | None:
+        """
+        :param app:
+        :param releases: Release objects, newest first
+        :return: The newest release that the definition allows, if any
+        """
+        for release in releases:
+            if release["prerelease"] and app.prerelease:
+                return release
+            if not release["prerelease"]:
+                return release
+        return None
+
+    @classmethod
+    def resolve_batch(cls, apps: list[GithubApp]) -> None:
+        """
+        Resolve the latest versions of many GitHub apps with a few GraphQL queries instead of one REST call each.
+        GraphQL needs authentication, so this only does something if a GitHub token is configured. Apps that are not
+        resolved here are left alone and do their REST call in execute().
+        """
+        auth = configuration.auth
+        if not apps or not ("github_token" in auth and auth["github_token"].strip()):
+            return
+        repos: dict[tuple[str, str], list[GithubApp]] = {}
+        for app in apps:
+            repos.setdefault((app.user, app.project), []).append(app)
+        keys = list(repos)
+        for start in range(0, len(keys), GRAPHQL_CHUNK):
+            chunk = keys[start : start + GRAPHQL_CHUNK]
+            try:
+                response = http_session.post(
+                    GITHUB_GRAPHQL, json=cls.__graphql_query(chunk), headers=repos[chunk[0]][0].headers
+                )
+                if response.status_code != 200:
+                    raise HTTPError(response.status_code)
+                data = response.json()["data"]
+                if not isinstance(data, dict):  # "data": null comes with errors about the whole query
+                    raise ValueError(data)
+            except (RequestException, HTTPError, ValueError, KeyError, TypeError):
+                print(f"{Ansi.WARNING}GitHub GraphQL query failed, checking apps one by one.{Ansi.RESET}")
+                return
+            for i, key in enumerate(chunk):
+                repository = data.get(f"r{i}")
+                if not repository:
+                    continue
+                try:
+                    releases = [
+                        {
+                            "prerelease": node["isPrerelease"],
+                            "published_at": node["publishedAt"],
+                            "assets": [
+                                {"browser_download_url": a["downloadUrl"]} for a in node["releaseAssets"]["nodes"]
+                            ],
+                        }
+                        for node in repository["releases"]["nodes"]
+                        if not node["isDraft"] and node["publishedAt"]
+                    ]
+                except (KeyError, TypeError):  # Left to the app's REST call
+                    continue
+                for app in repos[key]:
+                    app.use_releases(releases)
+
+    @classmethod
+    def __graphql_query(cls, repos: list[tuple[str, str]]) -> JsonObject:
+        params = ", ".join(f"$o{i}: String!, $n{i}: String!" for i in range(len(repos)))
+        fields = "\n".join(
+            GRAPHQL_REPO.format(i=i, releases=GRAPHQL_RELEASES, assets=GRAPHQL_ASSETS) for i in range(len(repos))
+        )
+        variables = {}
+        for i, (user, project) in enumerate(repos):
+            variables[f"o{i}"], variables[f"n{i}"] = user, project
+        return {"query": f"query({params}) {{\n{fields}\n}}", "variables": variables}
@@ -12,3 +12,4 @@ DIR_APP: str = os.path.abspath(os.path.join(__file__, "..", "..", "..", ".."))
 if getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS"):
     DIR_APP: str = os.path.abspath(os.path.dirname(sys.argv[0]))
 DIR_CFG: str = os.path.join(DIR_APP, "config")
+DIR_CACHE: str = os.path.join(DIR_APP, "cache")
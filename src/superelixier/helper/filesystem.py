@@ -6,6 +6,10 @@ If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import os
+import random
+import string
+from contextlib import contextmanager
+from typing import Collection, Iterator
 
 
 def remove_empty_dirs(top_dir: str, delete_top=False) -> None:
@@ -13,24 +17,52 @@ def remove_empty_dirs(top_dir: str, delete_top=False) -> None:
     Delete empty folders created by this program. Do not use on app folders! We don't mess with the UX of installed
     apps that way.
 
+    One bottom-up pass: a folder is removed once its subfolders are, so folders that only held empty folders go too.
+
     :param top_dir:
     :param delete_top:
     """
-    empty_dirs = True
-    while empty_dirs:
-        empty_dirs = False
-        for root, subdirs, _ in os.walk(top_dir):
-            for subdir in subdirs:
-                my_path = os.path.join(root, subdir)
-                if len(os.listdir(os.path.join(root, subdir))) == 0:
-                    empty_dirs = True
-                    os.rmdir(my_path)
-    if delete_top:
-        try:
-            if len(os.listdir(top_dir)) == 0:
-                os.rmdir(top_dir)
-        except FileNotFoundError:
-            pass
+    try:
+        empty = _prune(top_dir)
+    except FileNotFoundError:
+        return
+    if delete_top and empty:
+        os.rmdir(top_dir)
+
+
+def _prune(directory: str) -> bool:
+    """
+    :return: True if directory is empty after removing its empty subfolders
+    """
+    with os.scandir(directory) as entries:
+        entries = list(entries)
+    empty = True
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False) and _prune(entry.path):
+            os.rmdir(entry.path)
+        else:
+            empty = False
+    return empty
+
+
+@contextmanager
+def atomic_write(path: str) -> Iterator[str]:
+    """
+    Replace a file in one step, so that a crash or a concurrent reader never sees it half-written.
+
+    Yields a temporary path next to path for the caller to write. When the block completes, the temporary file is
+    moved over path; if the block raises, it is removed.
+
+    :param path: File to write
+    """
+    tmp = f"{path}.{''.join(random.choices(string.ascii_lowercase + string.digits, k=8))}"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise
 
 
 def make_path_native(path: str) -> str:
@@ -40,16 +72,47 @@ def make_path_native(path: str) -> str:
     return os.path.join(*crumbs)
 
 
-def simple_folder_list(folder):
+class DirectoryMaker:
+    """
+    os.makedirs that remembers the folders it has seen, so that placing many files in the same folders costs one
+    system call per folder instead of one per file.
+    """
+
+    def __init__(self):
+        self.__known: set[str] = set()
+
+    def makedirs(self, directory: str) -> None:
+        if directory in self.__known:
+            return
+        os.makedirs(directory, exist_ok=True)
+        while directory and directory not in self.__known:
+            self.__known.add(directory)
+            directory = os.path.dirname(directory)
+
+
+def scan_files(folder: str, skip: Collection[str] = ()) -> dict[str, os.stat_result]:
     """
+    List a folder tree with os.scandir. On Windows, the stat data comes with the directory listing, so a tree on a
+    network share costs one round trip per folder rather than one per file.
 
     :param folder: Folder to scan
-    :return: List of absolute file paths
-    """
-    full_list = []
-    for root, _, files in os.walk(folder):
-        for file in files:
-            my_path = os.path.join(root, file)
-            if os.path.isfile(my_path):
-                full_list.append(my_path)
-    return full_list
+    :param skip: Subfolders to leave out, relative to folder
+    :return: Stat data of all files, by path relative to folder
+    """
+    files = {}
+    skip = {os.path.normpath(path) for path in skip}
+    pending = [""]
+    while pending:
+        relative = pending.pop()
+        try:
+            with os.scandir(os.path.join(folder, relative)) as entries:
+                for entry in entries:
+                    path = os.path.join(relative, entry.name)
+                    if entry.is_dir():
+                        if not entry.is_symlink() and path not in skip:  # Like os.walk, don't follow links
+                            pending.append(path)
+                    elif entry.is_file():
+                        files[path] = entry.stat()
+        except OSError:  # Like os.walk, skip folders that can't be listed
+            continue
+    return files
@@ -0,0 +1,52 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import codecs
+import json
+from typing import Any, Iterable, Iterator
+
+__all__ = ["iter_array"]
+
+WHITESPACE = " \t\r\n"
+
+
+def iter_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Decode a JSON array of objects or strings element by element while it is still arriving. Stopping the iteration
+    early means the rest of the document is never read or parsed.
+
+    :param chunks: UTF-8 encoded pieces of the document
+    :return: The elements of the array
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, started = "", 0, False
+    for chunk in chunks:
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("JSON document is not an array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Element is incomplete, read on
+            yield element
+    raise ValueError("JSON array is truncated")
@@ -5,8 +5,12 @@ This Source Code Form is subject to the terms of the Mozilla Public License, v.
 If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
+import contextvars
+import io
 import os
 import sys
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
 
 import colorama
@@ -45,3 +49,60 @@ def print_header(string, color="", *, frame_char="#") -> None:
 
 def clear() -> None:
     os.system(clear_str)
+
+
+_output_buffer = contextvars.ContextVar("output_buffer", default=None)
+
+
+@contextmanager
+def output_into(buffer: io.StringIO):
+    """
+    While GroupedOutput is active, output of the current context goes to the buffer.
+    """
+    token = _output_buffer.set(buffer)
+    try:
+        yield
+    finally:
+        _output_buffer.reset(token)
+
+
+class GroupedOutput(io.TextIOBase):
+    """
+    Stand-in for sys.stdout while several apps are processed at once. Work on an app is done inside output_into with
+    the app's buffer, which is printed as one block when the app is done. Other output is passed through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.__lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = _output_buffer.get()
+        if buffer is not None:
+            return buffer.write(text)
+        with self.__lock:
+            return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def release(self, buffer: io.StringIO) -> None:
+        """
+        Print the buffer as one block.
+        """
+        with self.__lock:
+            self.stream.write(buffer.getvalue())
+            self.stream.flush()
+
+
+@contextmanager
+def grouped_output():
+    output = GroupedOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        yield output
+    finally:
+        sys.stdout = output.stream
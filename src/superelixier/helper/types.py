@@ -7,6 +7,7 @@ You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 from typing import Any, Literal
 
+CheckMode = Literal["async", "threaded", "serial"]
 DefinitionCategory = Literal[
     "Audio & Video", "Developer Tools", "Emulators", "Gaming", "Network Tools", "Security", "Utilities"
 ]
@@ -20,5 +21,13 @@ Json = JsonArray | JsonObject
 JsonResponse = Json | None
 
 UpdateStatus = Literal[
-    "no_update", "installed_newer", "update", "no_version_file", "not_installed", "error", "failed", "unknown"
+    "no_update",
+    "installed_newer",
+    "update",
+    "no_version_file",
+    "not_installed",
+    "error",
+    "failed",
+    "timed_out",
+    "unknown",
 ]
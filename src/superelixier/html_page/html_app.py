@@ -6,8 +6,8 @@ If a copy of the MPL was not distributed with this file,
 You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 import re
+from urllib.parse import urlparse
 
-import requests as rest
 from requests import RequestException
 from urllib3.exceptions import HTTPError
 
@@ -15,7 +15,11 @@ from superelixier.definition import Definition
 from superelixier.file_handler.downloader import Downloader
 from superelixier.generic.generic_app import GenericApp, VersionInfo
 from superelixier.generic.generic_manager import GenericManager
+from superelixier.helper.terminal import Ansi
 from superelixier.html_page import HEADERS
+from superelixier.html_page.scraper import PageTooLargeException, scan_page
+from superelixier.network.session import http_session
+from superelixier.network.single_flight import single_flight
 
 
 class HTMLApp(GenericApp):
@@ -42,24 +46,32 @@ class HTMLApp(GenericApp):
                 print(f"Error checking {self.name}: {e.__class__.__name__}")
                 self.update_status = "unknown"
 
-    def __web_request(self):
-        try:
-            request = rest.get(self._url, headers=HEADERS)
+    def __web_request(self) -> list[re.Match] | None:
+        pattern = self._blob_permalink_re if self._blob_permalink else self._blob_re
+
+        def fetch() -> list[re.Match] | None:
+            request = http_session.get(self._url, headers=HEADERS, stream=True)
             if request.status_code != 200:
+                request.close()
                 return None
+            return scan_page(request, pattern)
+
+        try:
+            # Definitions that scan the same page for the same pattern share one request
+            return single_flight.do(("html", self._url, pattern), fetch)
         except (RequestException, HTTPError):
             return None
-        return request.text
+        except PageTooLargeException as e:
+            print(f"{Ansi.ERROR}{self.name}: {e}")
+            return None
 
     def __get_latest_version(self):
         versions: list[VersionInfo] = []
         if self._blob_permalink:
-            matches = re.findall(self._blob_permalink_re, self._web_call)
-            for match in matches:
-                versions.append(VersionInfo(version_id=match, blobs=[self._blob_permalink]))
+            for match in self._web_call:
+                versions.append(VersionInfo(version_id=HTMLApp.__findall_value(match), blobs=[self._blob_permalink]))
         elif self._blob_re:
-            matches = re.finditer(self._blob_re, self._web_call)
-            for match in matches:
+            for match in self._web_call:
                 versions.append(
                     VersionInfo(
                         version_id=match.group("ver"), blobs=[Downloader.normalize_url(match.group("url"), self._url)]
@@ -68,10 +80,24 @@ class HTMLApp(GenericApp):
         version = GenericManager.get_newest(self._versioning, versions)
         return version
 
+    @classmethod
+    def __findall_value(cls, match: re.Match):
+        """
+        What re.findall would have returned for the match.
+        """
+        groups = match.groups(default="")
+        if len(groups) == 0:
+            return match.group()
+        return groups[0] if len(groups) == 1 else groups
+
     @property
     def versioning(self):
         return self.definition.html.versioning
 
+    @property
+    def host(self):
+        return urlparse(self._url).netloc
+
     @property
     def web_call(self):
         return self._web_call
@@ -0,0 +1,80 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import codecs
+import re
+
+from requests import Response
+
+from superelixier.network.cancellation import check_cancelled
+
+__all__ = ["PageTooLargeException", "scan_page"]
+
+CHUNK_SIZE: int = 64 * 1024
+MAX_PAGE_SIZE: int = 8 * 1024**2  #: Pages larger than this are not read to the end
+WINDOW: int = 256 * 1024  #: Longest piece of text that is held back while waiting for a line break
+OVERLAP: int = 16 * 1024  #: How much of an overlong line is kept for the next scan. Longer matches may be missed.
+# Pattern features that can match a line break or depend on where the text starts or ends
+MULTILINE_TOKENS = re.compile(r"\\[sSWDnrAZ]|\[\^|\(\?[aiLmsux-]*s|[\^$]")
+
+
+class PageTooLargeException(Exception):
+    pass
+
+
+def scan_page(response: Response, pattern: str, *, max_size=MAX_PAGE_SIZE) -> list[re.Match]:
+    """
+    Run the pattern over a streamed web page while it arrives.
+
+    Patterns that cannot match across lines are run line by line, so only the current line has to be held in memory.
+    Any other pattern is run over the whole page once it has arrived, like re.finditer would.
+
+    :param response: Response of a request made with stream=True. It is closed by this function.
+    :param pattern:
+    :param max_size: Give up if the page has more bytes than this
+    :return: The matches, in page order
+    """
+    regex = re.compile(pattern)
+    by_line = MULTILINE_TOKENS.search(pattern) is None
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    matches: list[re.Match] = []
+    seen: set[tuple[int, int]] = set()
+    buffer, offset, size = "", 0, 0  # offset: position of the buffer in the page
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            check_cancelled()
+            size += len(chunk)
+            if size > max_size:
+                raise PageTooLargeException(f"Page is larger than {max_size} bytes")
+            buffer += decoder.decode(chunk)
+            if not by_line:
+                continue
+            cut = buffer.rfind("\n") + 1
+            if cut == 0 and len(buffer) > WINDOW:
+                cut = len(buffer) - OVERLAP
+                _collect(regex, buffer, offset, matches, seen)
+            elif cut > 0:
+                _collect(regex, buffer[:cut], offset, matches, seen)
+            buffer, offset = buffer[cut:], offset + cut
+        buffer += decoder.decode(b"", final=True)
+        _collect(regex, buffer, offset, matches, seen)
+    finally:
+        response.close()
+    return matches
+
+
+def _collect(regex: re.Pattern, text: str, offset: int, matches: list[re.Match], seen: set[tuple[int, int]]) -> None:
+    """
+    Add the matches in text. Overlong lines are scanned in overlapping pieces, so the same match can be found twice;
+    it is recognized by the position of its first group (or the whole match) in the page.
+    """
+    for match in regex.finditer(text):
+        index = 1 if regex.groups else 0
+        key = (offset + match.start(index), offset + match.end(index))
+        if key not in seen:
+            seen.add(key)
+            matches.append(match)
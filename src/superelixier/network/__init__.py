@@ -0,0 +1,14 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+POOL_CONNECTIONS: int = 32  #: Hosts to keep a connection pool for
+POOL_MAXSIZE: int = 32  #: Keep-alive connections per host
+MAX_PER_HOST: int = 8  #: Concurrent requests per host, and checks per host in the async check engine
+MAX_RATE_LIMIT_DELAY: float = 90  #: Longest wait for a rate limit reset, in seconds. Beyond that, requests just fail.
+TIMEOUT: tuple[float, float] = (10, 20)  #: Connect and read timeouts of each request, in seconds
+#: Hosts to pre-warm. Not api.github.com: every request to it, even a HEAD, counts against the rate limit of the checks.
+KNOWN_HOSTS = ("github.com", "objects.githubusercontent.com", "ci.appveyor.com")
@@ -0,0 +1,91 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from requests import RequestException
+
+__all__ = ["CancelledException", "Deadline", "cancel_all", "check_cancelled", "deadline", "is_cancelled", "timeout"]
+
+MIN_TIMEOUT: float = 0.01
+
+_cancelled = threading.Event()
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class CancelledException(RequestException):
+    """
+    Network work was stopped because its deadline passed or everything was cancelled. This is a RequestException, so
+    the existing error handling treats it like a failed request.
+    """
+
+
+class Deadline:
+    def __init__(self, seconds: float | None):
+        self.__end = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> float | None:
+        """
+        :return: Seconds left, or None if there is no deadline
+        """
+        return None if self.__end is None else max(self.__end - time.monotonic(), 0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0
+
+
+@contextmanager
+def deadline(limit: Deadline):
+    """
+    Work done in this context (including threads started with asyncio.to_thread) must be finished by the deadline.
+    Requests get their timeouts shortened to fit and raise CancelledException once it has passed.
+    """
+    token = _deadline.set(limit)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def cancel_all() -> None:
+    """
+    Make all network work stop at the next opportunity, e.g. after Ctrl+C.
+    """
+    _cancelled.set()
+
+
+def is_cancelled() -> bool:
+    current = _deadline.get()
+    return _cancelled.is_set() or (current is not None and current.expired)
+
+
+def check_cancelled() -> None:
+    """
+    Call this between steps of long-running network work.
+    """
+    if _cancelled.is_set():
+        raise CancelledException("Cancelled")
+    current = _deadline.get()
+    if current is not None and current.expired:
+        raise CancelledException("Deadline exceeded")
+
+
+def timeout(default: tuple[float, float]) -> tuple[float, float]:
+    """
+    :param default: (connect, read) timeouts
+    :return: The timeouts, shortened to the current deadline
+    """
+    current = _deadline.get()
+    remaining = None if current is None else current.remaining()
+    if remaining is None:
+        return default
+    remaining = max(remaining, MIN_TIMEOUT)
+    return min(default[0], remaining), min(default[1], remaining)
@@ -0,0 +1,107 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+from requests import Response
+
+from superelixier.helper.environment import DIR_CACHE
+from superelixier.helper.filesystem import atomic_write
+from superelixier.helper.types import Json
+from superelixier.network.session import http_session
+from superelixier.network.single_flight import single_flight
+
+__all__ = ["CachedResponse", "ResponseCache"]
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    etag: str | None
+    last_modified: str | None
+    data: Json  #: parsed response body
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """
+        Request headers that make a request conditional on the cached representation.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    Persistent cache of parsed responses, keyed by URL. Requests for cached URLs are sent as conditional requests and
+    answered from the cache on "304 Not Modified", which is a tiny round trip with no parsing.
+    Concurrent requests for the same URL are made once; callers must use equivalent parse functions for a URL.
+    """
+
+    def __init__(self, namespace: str):
+        self.__dir = os.path.join(DIR_CACHE, namespace)
+
+    def get(self, url: str, *, parse: Callable[[Response], Json] = None, **kwargs) -> tuple[Response, Json]:
+        """
+        GET the URL, conditionally if it is in the cache.
+
+        :param url:
+        :param parse: Turns a "200 OK" response into the data to cache. Default: decode JSON
+        :param kwargs: Passed on to the session
+        :return: The response and the data, which is None unless the status code is 200 or 304
+        """
+        return single_flight.do((self.__dir, url), lambda: self.__get(url, parse, **kwargs))
+
+    def __get(self, url: str, parse: Callable[[Response], Json] | None, **kwargs) -> tuple[Response, Json]:
+        if parse is None:
+            parse = ResponseCache.__parse_json
+        cached = self.load(url)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            headers.update(cached.validators)
+        response = http_session.get(url, headers=headers, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            return response, cached.data
+        if response.status_code != 200:
+            _ = response.content  # Read the error body now, the response may be shared
+            return response, None
+        data = parse(response)
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self.store(CachedResponse(url=url, etag=etag, last_modified=last_modified, data=data))
+        return response, data
+
+    def load(self, url: str) -> CachedResponse | None:
+        try:
+            with open(self.__path(url), "r", encoding="utf-8") as fd:
+                cached = CachedResponse(**json.load(fd))
+        except (OSError, ValueError, TypeError):
+            return None
+        return cached if cached.url == url else None
+
+    def store(self, cached: CachedResponse) -> None:
+        try:
+            os.makedirs(self.__dir, exist_ok=True)
+            with atomic_write(self.__path(cached.url)) as tmp:
+                with open(tmp, "w", encoding="utf-8") as fd:
+                    json.dump(asdict(cached), fd)
+        except OSError:
+            pass
+
+    def __path(self, url: str) -> str:
+        return os.path.join(self.__dir, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    @classmethod
+    def __parse_json(cls, response: Response) -> Json:
+        return json.loads(response.text)
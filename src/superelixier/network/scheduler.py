@@ -0,0 +1,195 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Callable
+from urllib.parse import urlparse
+
+from requests import Response
+
+from superelixier.helper.terminal import Ansi
+from superelixier.network import MAX_PER_HOST, MAX_RATE_LIMIT_DELAY
+from superelixier.network.cancellation import check_cancelled, is_cancelled
+
+__all__ = ["PRIORITY_DEFAULT", "RequestScheduler", "prioritized", "request_scheduler"]
+
+POLL_INTERVAL: float = 0.5
+PRIORITY_DEFAULT: int = 10
+_priority = contextvars.ContextVar("priority", default=PRIORITY_DEFAULT)
+
+
+@contextmanager
+def prioritized(priority: int):
+    """
+    Requests made in this context (including threads started with asyncio.to_thread) get the priority. Lower numbers
+    are served first.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass
+class HostState:
+    active: int = 0
+    #: Heap of (priority, ticket, route) of waiting requests
+    queue: list[tuple[int, int, tuple[str, str]]] = field(default_factory=list)
+
+
+@dataclass
+class Budget:
+    remaining: int | None = None  #: Requests left in the rate limit window, if the host tells
+    reset: float | None = None  #: When the rate limit window ends, as a time.time() value
+
+
+class RequestScheduler:
+    """
+    Every remote call goes through here. The scheduler caps the number of concurrent requests per host, hands free
+    slots to the waiting request with the best priority, and keeps track of the rate limit budget that hosts announce
+    in their response headers. If the budget is used up and resets soon, requests wait for the reset instead of
+    failing.
+
+    A host can have several budgets, named by the X-RateLimit-Resource header, e.g. GitHub's "core" for the REST API
+    and "graphql". Which budget a request uses is learned from earlier responses to the same route, i.e. the same host
+    and first path segment.
+    """
+
+    def __init__(self, max_per_host: int = MAX_PER_HOST, max_delay: float = MAX_RATE_LIMIT_DELAY):
+        self.__max_per_host = max_per_host
+        self.__max_delay = max_delay
+        self.__condition = threading.Condition()
+        self.__hosts: dict[str, HostState] = {}
+        self.__budgets: dict[tuple[str, str | None], Budget] = {}  #: By host and rate limit resource
+        self.__resources: dict[tuple[str, str], str | None] = {}  #: Rate limit resource by route
+        self.__tickets = itertools.count()
+
+    def request(self, url: str, send: Callable[[], Response]) -> Response:
+        """
+        :param url: URL of the request
+        :param send: Makes the request
+        """
+        priority = _priority.get()
+        parsed = urlparse(url)
+        route = (parsed.netloc, parsed.path.lstrip("/").split("/")[0])
+        response = None
+        for _ in range(2):
+            with self.__slot(route, priority):
+                response = send()
+            if not self.__observe(route, response):
+                break
+            response.close()  # Rate limited, but the budget resets soon: retry once after waiting
+        return response
+
+    @contextmanager
+    def __slot(self, route: tuple[str, str], priority: int):
+        host = route[0]
+        with self.__condition:
+            state = self.__hosts.setdefault(host, HostState())
+            ticket = (priority, next(self.__tickets), route)
+            heapq.heappush(state.queue, ticket)
+            announced = False
+            while True:
+                if is_cancelled():
+                    state.queue.remove(ticket)
+                    heapq.heapify(state.queue)
+                    self.__condition.notify_all()
+                    check_cancelled()
+                budget = self.__budget(route)
+                delay = self.__budget_delay(budget)
+                if delay == 0 and state.active < self.__max_per_host and self.__next(state) == ticket:
+                    break
+                if delay > 0 and not announced:
+                    print(f"{Ansi.MAGENTA}{host}: Rate limit reached, waiting {delay:.0f} s{Ansi.RESET}")
+                    announced = True
+                # Wake up regularly, so cancellation is noticed
+                self.__condition.wait(timeout=min(delay or POLL_INTERVAL, POLL_INTERVAL))
+            state.queue.remove(ticket)
+            heapq.heapify(state.queue)
+            state.active += 1
+            if budget.remaining:
+                budget.remaining -= 1
+            self.__condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.__condition:
+                state.active -= 1
+                self.__condition.notify_all()
+
+    def __next(self, state: HostState) -> tuple[int, int, tuple[str, str]] | None:
+        """
+        The waiting request that gets the next free slot: the one with the best priority among those whose budget
+        allows it to be sent. Requests that wait for their budget don't hold up requests that use another one.
+        """
+        ready = (ticket for ticket in state.queue if self.__budget_delay(self.__budget(ticket[2])) == 0)
+        return min(ready, default=None)
+
+    def __budget(self, route: tuple[str, str]) -> Budget:
+        """
+        The budget that requests to the route have used so far. The caller must hold the condition.
+        """
+        resource = self.__resources.get(route)
+        return self.__budgets.setdefault((route[0], resource), Budget())
+
+    def __budget_delay(self, budget: Budget) -> float:
+        """
+        :return: Seconds to wait before the budget allows another request
+        """
+        if budget.remaining is None or budget.remaining > 0:
+            return 0
+        wait = (budget.reset or 0) - time.time()
+        if wait <= 0:
+            budget.remaining, budget.reset = None, None
+            return 0
+        # Don't hold requests back for long. They are sent and fail, like they would without the scheduler.
+        return wait if wait <= self.__max_delay else 0
+
+    def __observe(self, route: tuple[str, str], response: Response) -> bool:
+        """
+        Update the route's budget from the response headers.
+
+        :return: True if the request was refused for rate limiting and should be retried after a short wait
+        """
+        headers, now = response.headers, time.time()
+        remaining, reset = headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset")
+        retry_after = self.__parse_retry_after(headers.get("Retry-After"), now)
+        with self.__condition:
+            if "X-RateLimit-Resource" in headers:
+                self.__resources[route] = headers["X-RateLimit-Resource"]
+            budget = self.__budget(route)
+            if remaining is not None and remaining.isdigit():
+                budget.remaining = int(remaining)
+                if reset is not None and reset.isdigit():
+                    budget.reset = float(reset)
+            if retry_after is not None:
+                budget.remaining, budget.reset = 0, retry_after
+            self.__condition.notify_all()
+            refused = response.status_code in (403, 429) and budget.remaining == 0
+            return refused and budget.reset is not None and 0 < budget.reset - now <= self.__max_delay
+
+    @classmethod
+    def __parse_retry_after(cls, value: str | None, now: float) -> float | None:
+        if not value:
+            return None
+        if value.isdigit():
+            return now + int(value)
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+
+request_scheduler = RequestScheduler()
@@ -0,0 +1,100 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import threading
+from typing import Iterable
+
+import requests
+from requests import RequestException
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError
+
+from superelixier.network import KNOWN_HOSTS, POOL_CONNECTIONS, POOL_MAXSIZE, TIMEOUT
+from superelixier.network.cancellation import check_cancelled, timeout
+from superelixier.network.scheduler import request_scheduler
+
+__all__ = ["HTTPSession", "http_session"]
+
+
+class HTTPSession:
+    """
+    Process-wide HTTP session. API calls, web pages and downloads all go through here, so that connections to a host
+    are kept alive and reused instead of doing a new TCP and TLS handshake for every request.
+    """
+
+    __state = {}
+
+    def __init__(self):
+        self.__dict__ = self.__state
+        if self.__state == {}:
+            self.__lock = threading.Lock()
+            self.__session = None
+            self.__pool_connections = POOL_CONNECTIONS
+            self.__pool_maxsize = POOL_MAXSIZE
+
+    def configure(self, *, pool_connections: int = None, pool_maxsize: int = None) -> None:
+        """
+        Change the pool sizes. Open connections are dropped if the session already exists.
+        """
+        with self.__lock:
+            if pool_connections is not None:
+                self.__pool_connections = pool_connections
+            if pool_maxsize is not None:
+                self.__pool_maxsize = pool_maxsize
+            if self.__session is not None:
+                self.__session.close()
+                self.__session = None
+
+    @property
+    def session(self) -> requests.Session:
+        if self.__session is None:
+            with self.__lock:
+                if self.__session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.__pool_connections, pool_maxsize=self.__pool_maxsize)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self.__session = session
+        return self.__session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Requests always have timeouts. They are shortened to fit the current deadline, if there is one.
+        """
+        check_cancelled()
+        limits = kwargs.pop("timeout", None) or TIMEOUT
+        if not isinstance(limits, tuple):
+            limits = (limits, limits)
+
+        def send():
+            return self.session.request(method, url, timeout=timeout(limits), **kwargs)
+
+        return request_scheduler.request(url, send)
+
+    def prewarm(self, hosts: Iterable[str] = KNOWN_HOSTS) -> None:
+        """
+        Connect to the given hosts in the background, e.g. while the definitions are being loaded.
+        Each host gets a HEAD request, which leaves a kept-alive connection in its pool, so the first real request to
+        the host can skip the DNS lookup and the handshakes.
+        """
+        for host in hosts:
+            threading.Thread(target=self.__warm, args=(host,), daemon=True).start()
+
+    def __warm(self, host: str) -> None:
+        try:
+            self.request("HEAD", f"https://{host}/", allow_redirects=False).close()
+        except (RequestException, HTTPError):
+            pass
+
+
+http_session = HTTPSession()
@@ -0,0 +1,67 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import threading
+from typing import Any, Callable, Hashable
+
+from superelixier.network.cancellation import check_cancelled
+
+__all__ = ["SingleFlight", "single_flight"]
+
+POLL_INTERVAL: float = 0.5
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.failed = False
+
+
+class SingleFlight:
+    """
+    Collapses duplicate work: of all callers that ask for the same key, only the first one runs the function. The
+    others wait for it and get the same result. Results are kept until clear() is called, so callers that come later
+    get them too. If the function raises, the key is forgotten and a waiting caller tries again.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        while True:
+            with self.__lock:
+                call = self.__calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self.__calls[key] = _Call()
+            if leader:
+                try:
+                    call.result = function()
+                except BaseException:
+                    with self.__lock:
+                        del self.__calls[key]
+                    call.failed = True
+                    raise
+                finally:
+                    call.done.set()
+                return call.result
+            while not call.done.wait(timeout=POLL_INTERVAL):
+                check_cancelled()
+            if not call.failed:
+                return call.result
+
+    def clear(self) -> None:
+        """
+        Forget all results. Calls in flight are not affected.
+        """
+        with self.__lock:
+            self.__calls = {key: call for key, call in self.__calls.items() if not call.done.is_set()}
+
+
+single_flight = SingleFlight()
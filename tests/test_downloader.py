@@ -0,0 +1,68 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import gzip
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+
+from superelixier.file_handler.downloader import Downloader
+
+PAYLOAD = b"superelixier " * 100000
+PAGE = '<html><script>function go() {window.location = "http://127.0.0.1:%d/app.zip";}</script></html>'
+
+
+class GzipHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves every body gzip-encoded, without Content-Length or ETag, so that nothing is resumed or stored.
+    """
+
+    def do_GET(self):
+        if self.path == "/page":
+            body, content_type = (PAGE % self.server.server_port).encode(), "text/html"
+        else:
+            body, content_type = PAYLOAD, "application/zip"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(gzip.compress(body))
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGzipDownload(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), GzipHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def download(self, path: str) -> bytes:
+        with tempfile.TemporaryDirectory() as tmp:
+            file = Downloader(f"{self.url}{path}", os.path.join(tmp, "download-incomplete")).file
+            self.assertIsNotNone(file)
+            with open(file, "rb") as fd:
+                return fd.read()
+
+    def test_encoded_body_is_decoded(self):
+        self.assertEqual(self.download("/app.zip"), PAYLOAD)
+
+    def test_encoded_javascript_redirect(self):
+        self.assertEqual(self.download("/page"), PAYLOAD)
+
+
+if __name__ == "__main__":
+    unittest.main()
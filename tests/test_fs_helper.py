@@ -0,0 +1,65 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from superelixier.file_handler.fs_helper import unchanged_files
+from superelixier.file_handler.manifest import FileRecord, file_digest
+
+MTIME_NS = 1_600_000_000 * 10**9  #: Like a build whose archive has fixed timestamps
+
+
+class TestUnchangedFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = SimpleNamespace(appdir=os.path.join(self.tmp.name, "app"))
+        self.staging = os.path.join(self.tmp.name, "staging")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, folder: str, content: bytes, mtime_ns: int = MTIME_NS) -> os.stat_result:
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, "app.exe")
+        with open(path, "wb") as fd:
+            fd.write(content)
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        return os.stat(path)
+
+    def unchanged(self, installed: FileRecord) -> dict[str, FileRecord]:
+        staged = {"app.exe": os.stat(os.path.join(self.staging, "app.exe"))}
+        return unchanged_files(self.app, self.staging, staged, {"app.exe": installed})
+
+    def test_same_size_and_mtime_but_new_contents(self):
+        installed = FileRecord.of(self.write(self.app.appdir, b"v1"))
+        self.write(self.staging, b"v2")
+        self.assertEqual(self.unchanged(installed), {})
+
+    def test_same_contents_with_new_mtime(self):
+        installed = FileRecord.of(self.write(self.app.appdir, b"v1"))
+        self.write(self.staging, b"v1", MTIME_NS + 10**9)
+        self.assertEqual(list(self.unchanged(installed)), ["app.exe"])
+
+    def test_manifest_digest_is_used(self):
+        stat = self.write(self.app.appdir, b"v1")
+        self.write(self.staging, b"v2")
+        installed = FileRecord(stat.st_size, stat.st_mtime_ns, file_digest(os.path.join(self.staging, "app.exe")))
+        # The recorded hash is trusted while the installed file matches its record
+        self.assertEqual(list(self.unchanged(installed)), ["app.exe"])
+
+    def test_stale_manifest_digest_is_recomputed(self):
+        self.write(self.app.appdir, b"v1", MTIME_NS + 10**9)  # Touched after the manifest was written
+        self.write(self.staging, b"v2")
+        stale = FileRecord(2, MTIME_NS, file_digest(os.path.join(self.staging, "app.exe")))
+        self.assertEqual(self.unchanged(stale), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+Copyright © 2022 Fabian H. Schneider
+
+This Source Code Form is subject to the terms of the Mozilla Public License, v. 2.0.
+If a copy of the MPL was not distributed with this file,
+You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+import contextlib
+import io
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from superelixier.github import github_manager
+from superelixier.github.github_manager import GithubManager
+
+RELEASE = {"isDraft": False, "isPrerelease": False, "publishedAt": "2022-01-01T00:00:00Z"}
+
+
+class FakeApp:
+    def __init__(self, user: str, project: str):
+        self.user, self.project, self.headers = user, project, {}
+        self.releases = None
+
+    def use_releases(self, releases):
+        self.releases = releases
+
+
+class TestResolveBatch(unittest.TestCase):
+    def resolve(self, body) -> tuple[list[FakeApp], str]:
+        apps = [FakeApp("owner", "one"), FakeApp("owner", "two")]
+        response = mock.Mock(status_code=200, json=mock.Mock(return_value=body))
+        output = io.StringIO()
+        with (
+            mock.patch.object(github_manager, "configuration", SimpleNamespace(auth={"github_token": "token"})),
+            mock.patch.object(github_manager.http_session, "post", return_value=response),
+            contextlib.redirect_stdout(output),
+        ):
+            GithubManager.resolve_batch(apps)
+        return apps, output.getvalue()
+
+    def test_resolved(self):
+        nodes = [dict(RELEASE, releaseAssets={"nodes": [{"downloadUrl": "https://example.org/app.zip"}]})]
+        apps, _ = self.resolve({"data": {"r0": {"releases": {"nodes": nodes}}, "r1": None}})
+        self.assertEqual(apps[0].releases[0]["assets"], [{"browser_download_url": "https://example.org/app.zip"}])
+        self.assertIsNone(apps[1].releases)
+
+    def test_null_data_falls_back(self):
+        apps, output = self.resolve({"data": None, "errors": [{"message": "Something went wrong"}]})
+        self.assertEqual([app.releases for app in apps], [None, None])
+        self.assertIn("checking apps one by one", output)
+
+    def test_malformed_repository_is_skipped(self):
+        nodes = [dict(RELEASE, releaseAssets={"nodes": []})]
+        apps, _ = self.resolve({"data": {"r0": {"releases": None}, "r1": {"releases": {"nodes": nodes}}}})
+        self.assertIsNone(apps[0].releases)
+        self.assertEqual(apps[1].releases[0]["assets"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()